@@ -0,0 +1,79 @@
+import numpy as np
+import pandas as pd
+
+# --- Anomaly scan ---
+# Robust z-score of every value against a rolling median / MAD of its own
+# series (an expense category, a manager): a mistyped amount with an extra
+# zero or a sudden conversion drop scores far outside +-THRESHOLD, while the
+# median and MAD themselves barely move because of one bad row.
+#
+#   score = 0.6745 * (x - median) / MAD      (Iglewicz & Hoaglin)
+#
+# All series are scored in one grouped rolling pass, so every month and every
+# city is scanned at once.
+
+WINDOW = 15        # rows per rolling window, centered on the scored row
+MIN_PERIODS = 5    # shorter histories are not scored
+THRESHOLD = 3.5
+MAD_FLOOR = 0.05   # MAD never below 5% of the median (fixed amounts like rent have MAD = 0)
+
+COLUMNS = ['Метрика', 'Значение', 'Норма', 'Оценка']
+
+
+def _rolling_median(values, groups, window, min_periods):
+    rolled = values.groupby(groups, observed=True, sort=False).rolling(window, center=True, min_periods=min_periods).median()
+    return rolled.reset_index(level=list(range(len(groups))), drop=True).reindex(values.index)
+
+
+def robust_scores(df, keys, columns, order, window=WINDOW, min_periods=MIN_PERIODS):
+    """
+    Score `columns` of each row against the rolling median / MAD of its group.
+    Returns (sorted df, median, score) frames aligned on the same index.
+    """
+    df = df.sort_values(keys + [order])
+    values = df[columns].astype(float)
+    groups = [df[k] for k in keys]
+    median = _rolling_median(values, groups, window, min_periods)
+    mad = _rolling_median((values - median).abs(), groups, window, min_periods)
+    scale = np.maximum(mad, MAD_FLOOR * median.abs()).where(lambda s: s > 0)
+    return df, median, 0.6745 * (values - median) / scale
+
+
+def flag(df, keys, columns, order, carry=(), threshold=THRESHOLD):
+    """Long frame of outliers: keys, order, carry, Метрика, Значение, Норма, Оценка; worst first."""
+    if df.empty:
+        return pd.DataFrame(columns=keys + [order] + list(carry) + COLUMNS)
+    df, median, score = robust_scores(df, keys, columns, order)
+    base = df[keys + [order] + list(carry)]
+    parts = [
+        base.assign(Метрика=col, Значение=df[col].astype(float), Норма=median[col], Оценка=score[col])
+        for col in columns
+    ]
+    flagged = pd.concat(parts, ignore_index=True)
+    flagged = flagged[flagged['Оценка'].abs() >= threshold]
+    return flagged.iloc[flagged['Оценка'].abs().argsort()[::-1]].reset_index(drop=True)
+
+
+def expense_anomalies(expenses, target):
+    """Outlier rows of 'Лист1' per category and of 'Таргет' (its own category)."""
+    parts = [
+        frame[['Дата', 'Месяц', 'Категория', 'Сумма']].astype({'Категория': str})
+        for frame in (expenses, target)
+        if not frame.empty and {'Дата', 'Категория', 'Сумма'} <= set(frame.columns)
+    ]
+    if not parts:
+        return pd.DataFrame(columns=['Категория', 'Дата', 'Месяц'] + COLUMNS)
+    ledger = pd.concat(parts, ignore_index=True).dropna(subset=['Дата'])
+    return flag(ledger.astype({'Месяц': str}), ['Категория'], ['Сумма'], 'Дата', carry=['Месяц'])
+
+
+def manager_anomalies(sales):
+    """
+    Outlier manager-days in revenue, leads and conversion.
+    sales: City, Manager, Date, Leads, Orders, Revenue rows of any number of months and cities.
+    """
+    if sales.empty:
+        return pd.DataFrame(columns=['City', 'Manager', 'Date'] + COLUMNS)
+    days = sales.groupby(['City', 'Manager', 'Date'], observed=True, as_index=False)[['Leads', 'Orders', 'Revenue']].sum()
+    days['Conversion'] = (days['Orders'] / days['Leads'].where(days['Leads'] > 0)) * 100
+    return flag(days, ['City', 'Manager'], ['Revenue', 'Leads', 'Conversion'], 'Date')
@@ -0,0 +1,229 @@
+import hashlib
+import json
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import branches
+import breakeven
+import data_plane
+import pnl
+import refresher
+import sales_stream
+import workbooks
+
+# --- Export API ---
+# KPIs as JSON for other internal tools, computed by the same functions the
+# Streamlit apps use and read from the same data-plane snapshots (no extra
+# downloads, no Streamlit sessions):
+#
+#   GET /pnl                               P&L by month
+#   GET /pnl?month=Январь                  one month + expenses by category
+#   GET /breakeven?avg_check=18000         break-even; omitted inputs = simulator defaults
+#   GET /leaderboard?city=Алматы           managers of the latest month sheet (+ streamed rows)
+#   GET /leaderboard?city=Алматы&sheet=…   a given month sheet
+#   GET /health                            snapshot age and last error per workbook, cache use per branch
+#
+# /pnl and /breakeven take ?branch=<key or name> (branches.json); default is
+# the first branch that has the workbook.
+#
+# Every response carries an ETag; pollers send If-None-Match and get an empty
+# 304 until the underlying snapshot (or the sales stream) changes. Bodies are
+# cached per query and data version, so a poll costs a dict lookup.
+#
+#   python api.py          (port AURORA_API_PORT, default 8602)
+
+PORT = int(os.environ.get("AURORA_API_PORT", "8602"))
+CACHE_SIZE = 256  # distinct queries kept
+
+_lock = threading.Lock()
+_cache = {}  # (path, query) -> (versions, etag, body)
+
+
+class ApiError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def _records(df):
+    """DataFrame -> list of dicts with JSON-native values (NaN -> null, dates -> ISO)."""
+    return json.loads(df.to_json(orient="records", date_format="iso", force_ascii=False))
+
+
+def _serve(branch, kind):
+    try:
+        return branches.serve(branch, kind)
+    except Exception as e:
+        raise ApiError(503, f"Нет данных: {e}")
+
+
+def _branch(query, kind):
+    """Branch key from ?branch= (key or name), or the first branch with workbook `kind`."""
+    available = branches.with_workbook(kind)
+    if "branch" not in query:
+        if not available:
+            raise ApiError(404, f"Ни у одного филиала нет '{kind}'")
+        return next(iter(available.values()))
+    key = branches.find(query["branch"][0])
+    if key not in available.values():
+        raise ApiError(404, f"У филиала '{query['branch'][0]}' нет '{kind}'")
+    return key
+
+
+def _number(query, name, default):
+    try:
+        return float(query[name][0]) if name in query else default
+    except ValueError:
+        raise ApiError(400, f"'{name}' должно быть числом")
+
+
+# --- Endpoints ---
+# Each returns (versions, build): versions identifies the data the response
+# depends on (None = never cached), build() computes the JSON payload.
+
+def pnl_endpoint(query):
+    branch = _branch(query, "pnl")
+    f = _serve(branch, "pnl")
+
+    def build():
+        months = pnl.by_month(f['Лист1'], f['Таргет'], f['Продажи по месяцам'])
+        if "month" not in query:
+            return {"months": _records(months)}
+        month = query["month"][0]
+        row = months[months['Месяц'] == month]
+        if row.empty:
+            raise ApiError(404, f"Нет месяца '{month}'")
+        return {**_records(row)[0], "categories": _records(pnl.by_category(f['Лист1'], f['Таргет'], month))}
+
+    return (branches.version(branch, "pnl"),), build
+
+
+def breakeven_endpoint(query):
+    branch = _branch(query, "fixed_costs")
+    params = {name: _number(query, name, default) for name, default in breakeven.DEFAULTS.items()}
+    extra = _number(query, "extra", 0)
+
+    details = _serve(branch, "fixed_costs")["fixed_costs"]
+
+    def build():
+        fixed = breakeven.total_fixed_costs(details["Сумма"].sum(), params["target_daily"], extra)
+        commission = params["pct_kaspi"] + params["pct_tax"] + params["pct_florist"] + params["pct_manager"]
+        be = breakeven.break_even(fixed, params["avg_check"], params["markup"], params["var_cost_per_order"], commission)
+        return {"branch": branch, "inputs": {**params, "extra": extra}, "fixed_costs": fixed, "commission_pct": commission, **be,
+                "reachable": be["qty"] != breakeven.NO_BREAK_EVEN}
+
+    return (branches.version(branch, "fixed_costs"),), build
+
+
+def leaderboard_endpoint(query):
+    if "city" not in query:
+        raise ApiError(400, "Укажите city")
+    city = sales_stream.city_id(query["city"][0])
+    if city is None:
+        raise ApiError(404, f"Неизвестный город '{query['city'][0]}'")
+    sheets = _serve(city, "sales")
+    sales_stream.poll()
+
+    def build():
+        months = workbooks.month_sheets(sheets)
+        if "sheet" in query:
+            name = query["sheet"][0]
+            if name not in months:
+                raise ApiError(404, f"Нет листа '{name}'")
+            df = sheets[name]
+        else:
+            name, df = workbooks.latest_sales_sheet(sheets)
+        if df.empty:
+            raise ApiError(404, f"Лист '{name}' пуст или с неверными заголовками")
+        stream = sales_stream.aggregates(city, name, df)
+        return {"city": query["city"][0], "sheet": name, "sheets": list(months),
+                "totals": stream.totals(), "managers": _records(stream.manager_stats())}
+
+    return (branches.version(city, "sales"), sales_stream.revision()), build
+
+
+def health_endpoint(query):
+    names = branches.urls()
+
+    def build():
+        return {"workbooks": [{"url": name, "age": refresher.data_age(name),
+                               "last_error": (refresher.status(name) or {}).get("last_error")} for name in names],
+                "caches": data_plane.cache_stats()}
+
+    return None, build  # ages change every second
+
+
+ROUTES = {
+    "/pnl": pnl_endpoint,
+    "/breakeven": breakeven_endpoint,
+    "/leaderboard": leaderboard_endpoint,
+    "/health": health_endpoint,
+}
+
+
+def respond(path, query):
+    """(etag, body bytes) for a GET; raises ApiError."""
+    endpoint = ROUTES.get(path.rstrip("/") or "/")
+    if endpoint is None:
+        raise ApiError(404, f"Нет такого адреса: {path}")
+    versions, build = endpoint(query)
+    key = (path, tuple(sorted((k, tuple(v)) for k, v in query.items())))
+
+    with _lock:
+        cached = _cache.get(key)
+    if versions is not None and cached and cached[0] == versions:
+        return cached[1], cached[2]
+
+    body = json.dumps(build(), ensure_ascii=False, default=lambda v: v.item() if hasattr(v, "item") else str(v)).encode()
+    etag = '"' + hashlib.sha1(body).hexdigest()[:16] + '"'
+    if versions is not None:
+        with _lock:
+            _cache.pop(key, None)
+            _cache[key] = (versions, etag, body)
+            while len(_cache) > CACHE_SIZE:
+                _cache.pop(next(iter(_cache)))
+    return etag, body
+
+
+class _ApiHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        url = urlparse(self.path)
+        try:
+            etag, body = respond(url.path, parse_qs(url.query))
+        except ApiError as e:
+            self._send(e.status, json.dumps({"error": str(e)}, ensure_ascii=False).encode())
+            return
+
+        if etag in [t.strip() for t in self.headers.get("If-None-Match", "").split(",")]:
+            self._send(304, b"", etag)
+        else:
+            self._send(200, body, etag)
+
+    def _send(self, status, body, etag=None):
+        self.send_response(status)
+        if etag:
+            self.send_header("ETag", etag)
+            self.send_header("Cache-Control", "no-cache")  # always revalidate, 304 is cheap
+        if status != 304:
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if status != 304:
+            self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def main(port=PORT):
+    for city_name, key in branches.with_workbook("sales").items():
+        sales_stream.register_city(key, city_name, branches.BRANCHES[key]["sales"]["sheet_id"])
+    server = ThreadingHTTPServer(("127.0.0.1", port), _ApiHandler)
+    print(f"Export API on http://127.0.0.1:{port}")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,44 +1,22 @@
 import streamlit as st
 import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
-import requests
-import io
-import ssl
-
-# Bypass SSL verification for legacy environments
-ssl._create_default_https_context = ssl._create_unverified_context
+import branches
+import data_plane
+import pnl
+import refresher
+import workbooks
+from freshness import show_data_age
+from schema import process_footprint
+from table_view import paged_table
 
 # --- Configuration ---
 st.set_page_config(page_title="P&L Отчет", layout="wide")
 
-# Updated Data Source
-DATA_URL = "https://docs.google.com/spreadsheets/d/1NUpmMswEtKyX1AIeM9p1m8VHjWpPnR8VeJfr1m7Qgsg/export?format=xlsx"
+# Data Source: branches with a P&L workbook in branches.json
+PNL_BRANCHES = branches.with_workbook("pnl")
 
 # --- Helper Functions ---
 
-def clean_amount(val):
-    if isinstance(val, (int, float)):
-        return float(val)
-    if isinstance(val, str):
-        val = val.replace(' ', '').replace('\xa0', '')
-        val = val.replace(',', '.')
-        try:
-            return float(val)
-        except ValueError:
-            return 0.0
-    return 0.0
-
-def get_russian_month_name(date_obj):
-    if pd.isnull(date_obj):
-        return None
-    months = {
-        1: 'Январь', 2: 'Февраль', 3: 'Март', 4: 'Апрель',
-        5: 'Май', 6: 'Июнь', 7: 'Июль', 8: 'Август',
-        9: 'Сентябрь', 10: 'Октябрь', 11: 'Ноябрь', 12: 'Декабрь'
-    }
-    return months.get(date_obj.month)
-
 def format_currency(value):
     """
     Format number: 1234567.89 -> "1 234 567" or "1 234 567.89"
@@ -56,66 +34,50 @@ def format_currency(value):
          s = f"{value:,.2f}".replace(",", " ")
          return s
 
+def format_date(value):
+    return value.strftime('%d.%m.%Y') if pd.notnull(value) else ""
+
 # --- Data Loading ---
-@st.cache_data(ttl=300)
-def load_data(url):
+def load_data(branch):
+    """
+    Last good snapshot from the shared data plane, revalidated in background every 5 minutes.
+    Returns (expenses, target, sales, memory report, dropped rows); frames are shared, read-only.
+    """
     try:
-        response = requests.get(url, verify=False)
-        response.raise_for_status()
-        xls = pd.ExcelFile(io.BytesIO(response.content))
-        df_expenses = pd.read_excel(xls, 'Лист1')
-        df_target = pd.read_excel(xls, 'Таргет')
-        df_sales = pd.read_excel(xls, 'Продажи по месяцам')
-        return df_expenses, df_target, df_sales
+        frames = branches.serve(branch, "pnl")
     except Exception as e:
         st.error(f"Error loading data: {e}")
-        return pd.DataFrame(), pd.DataFrame(), pd.DataFrame()
-
-def preprocess_data(df_expenses, df_target, df_sales):
-    # Expenses (List1)
-    if not df_expenses.empty:
-        if 'Сумма' in df_expenses.columns:
-            df_expenses['Сумма'] = df_expenses['Сумма'].apply(clean_amount)
-        if 'Дата' in df_expenses.columns:
-            df_expenses['Дата'] = pd.to_datetime(df_expenses['Дата'], dayfirst=True, errors='coerce')
-            df_expenses['Месяц'] = df_expenses['Дата'].apply(get_russian_month_name)
-    
-    # Target (Target Ads) - Renaming columns to match centralized schema (Date, Amount, Category)
-    if not df_target.empty:
-        if 'Сумма в тенге' in df_target.columns:
-            df_target['Сумма'] = df_target['Сумма в тенге'].apply(clean_amount) # Create 'Amount'
-        if 'Дата' in df_target.columns:
-            df_target['Дата'] = pd.to_datetime(df_target['Дата'], dayfirst=True, errors='coerce')
-            df_target['Месяц'] = df_target['Дата'].apply(get_russian_month_name)
-        
-        # Add explicit Category for Target rows
-        df_target['Категория'] = 'Таргет'
-
-    # Sales
-    if not df_sales.empty and 'Месяц' in df_sales.columns:
-        df_sales['Месяц'] = df_sales['Месяц'].astype(str).str.strip()
-        if 'Сумма продаж' in df_sales.columns:
-            df_sales['Сумма продаж'] = df_sales['Сумма продаж'].apply(clean_amount)
-            
-    return df_expenses, df_target, df_sales
+        return pd.DataFrame(), pd.DataFrame(), pd.DataFrame(), pd.DataFrame(), pd.DataFrame()
+    return frames['Лист1'], frames['Таргет'], frames['Продажи по месяцам'], frames['Память'], frames.get(workbooks.DROPPED_SHEET, pd.DataFrame())
 
 # --- Main App ---
 def main():
-    st.title("Aurora Astana P&L Отчет")
+    if not PNL_BRANCHES:
+        st.error("Ни у одного филиала в branches.json нет P&L таблицы.")
+        return
+    branch_name = st.sidebar.selectbox("Филиал", list(PNL_BRANCHES)) if len(PNL_BRANCHES) > 1 else next(iter(PNL_BRANCHES))
+    branch = PNL_BRANCHES[branch_name]
+    data_url = branches.url(branch, "pnl")
+
+    st.title(f"Aurora {branch_name.split()[-1]} P&L Отчет")
     
     # Sidebar
     if st.sidebar.button("Обновить данные"):
-        st.cache_data.clear()
-        st.rerun()
+        try:
+            with st.spinner("Обновляем данные..."):
+                refresher.refresh_now(data_url)
+            st.rerun()
+        except Exception as e:
+            st.sidebar.error(f"Не удалось обновить: {e}")
 
-    raw_expenses, raw_target, raw_sales = load_data(DATA_URL)
+    df_expenses, df_target, df_sales, mem_report, dropped = load_data(branch)
     
-    if raw_sales.empty:
+    show_data_age(data_url)
+
+    if df_sales.empty:
         st.warning("Не удалось загрузить данные (нет листа Продажи).")
         return
 
-    df_expenses, df_target, df_sales = preprocess_data(raw_expenses.copy(), raw_target.copy(), raw_sales.copy())
-
     # Sidebar: Month Selection
     available_months = df_sales['Месяц'].unique().tolist() if 'Месяц' in df_sales.columns else []
     available_months = [m for m in available_months if m and str(m).lower() != 'nan']
@@ -128,29 +90,19 @@ def main():
 
     # --- Filtering & Logic ---
     
-    # 1. Filter DataFrames
-    expenses_curr = df_expenses[df_expenses['Месяц'] == selected_month].copy()
-    target_curr = df_target[df_target['Месяц'] == selected_month].copy()
-    sales_curr = df_sales[df_sales['Месяц'] == selected_month].copy()
+    # 1. Filter DataFrames (boolean masks already return new frames)
+    expenses_curr = df_expenses[df_expenses['Месяц'] == selected_month]
+    target_curr = df_target[df_target['Месяц'] == selected_month]
+    sales_curr = df_sales[df_sales['Месяц'] == selected_month]
 
     # 2. Combine Expenses (Regular + Target) for analysis
-    # Need consistent columns: Дата, Категория, Сумма
-    cols = ['Дата', 'Категория', 'Сумма']
-    
-    # Fix missing columns if empty
-    if 'Категория' not in expenses_curr.columns: expenses_curr['Категория'] = 'Uncategorized'
-    if 'Сумма' not in expenses_curr.columns: expenses_curr['Сумма'] = 0.0
-    
-    # Combine
-    combined_expenses = pd.concat([
-        expenses_curr[cols],
-        target_curr[cols]
-    ], ignore_index=True)
+    combined_expenses = pnl.combine_expenses(expenses_curr, target_curr)
 
-    # 3. Calculate KPI Values
-    val_revenue = sales_curr['Сумма продаж'].sum() if not sales_curr.empty else 0.0
-    val_expenses = combined_expenses['Сумма'].sum() if not combined_expenses.empty else 0.0
-    val_net_profit = val_revenue - val_expenses
+    # 3. Calculate KPI Values (same figures the export API serves)
+    kpis = pnl.by_month(expenses_curr, target_curr, sales_curr).set_index('Месяц').loc[selected_month]
+    val_revenue = kpis['Выручка']
+    val_expenses = kpis['Расходы']
+    val_net_profit = kpis['Чистая прибыль']
 
     # --- BLOCK 1: MAIN KPIs ---
     st.header("Ключевые показатели")
@@ -164,13 +116,14 @@ def main():
     st.divider()
 
     # --- BLOCK 2: CHARTS ---
+    import plotly.express as px  # deferred: ~0.3 s of import, not needed for the first paint
     c1, c2 = st.columns(2)
     
     with c1:
         st.subheader("Структура расходов (Топ)")
         if not combined_expenses.empty:
             # Group by Category
-            cat_group = combined_expenses.groupby('Категория')['Сумма'].sum().reset_index()
+            cat_group = combined_expenses.groupby('Категория', observed=True)['Сумма'].sum().reset_index()
             # Sort descending for horizontal bar (visual top-down)
             cat_group = cat_group.sort_values(by='Сумма', ascending=True) 
             
@@ -184,7 +137,7 @@ def main():
         st.subheader("Доля расходов в %")
         if not combined_expenses.empty:
             # Group by Category for Pie Chart (All categories)
-            pie_data = combined_expenses.groupby('Категория')['Сумма'].sum().reset_index()
+            pie_data = combined_expenses.groupby('Категория', observed=True)['Сумма'].sum().reset_index()
             # Remove 0s
             pie_data = pie_data[pie_data['Сумма'] > 0]
             
@@ -203,26 +156,41 @@ def main():
     with t1:
         st.subheader("Детализация Расходов (Лист1)")
         if not expenses_curr.empty:
-            # Sort by Date
-            exp_display = expenses_curr.sort_values(by='Дата', ascending=False).copy()
-            exp_display['Дата'] = exp_display['Дата'].dt.strftime('%d.%m.%Y')
-            exp_display['Сумма'] = exp_display['Сумма'].apply(format_currency)
-            st.dataframe(exp_display[['Дата', 'Категория', 'Сумма']], use_container_width=True, height=500)
+            # Sorted/filtered on raw values, only the visible page is formatted
+            paged_table(
+                expenses_curr, key="expenses", columns=['Дата', 'Категория', 'Сумма'],
+                formatters={'Дата': format_date, 'Сумма': format_currency},
+                sort_col='Дата', amount_col='Сумма', category_col='Категория'
+            )
         else:
             st.write("Нет расходов.")
 
     with t2:
         st.subheader("Детализация Таргета")
         if not target_curr.empty:
-            # Sort by Date
-            tgt_display = target_curr.sort_values(by='Дата', ascending=False).copy()
-            tgt_display['Дата'] = tgt_display['Дата'].dt.strftime('%d.%m.%Y')
-            tgt_display['Сумма'] = tgt_display['Сумма'].apply(format_currency)
-            # Target usually doesn't have varied categories, but we added 'Таргет' column. 
-            # We can show it or just Date/Amount. Let's show Category too for consistency or just Amount.
-            st.dataframe(tgt_display[['Дата', 'Сумма']], use_container_width=True, height=500)
+            # Target has a single category ('Таргет'), so only Date/Amount
+            paged_table(
+                target_curr, key="target", columns=['Дата', 'Сумма'],
+                formatters={'Дата': format_date, 'Сумма': format_currency},
+                sort_col='Дата', amount_col='Сумма'
+            )
         else:
             st.write("Нет трат на таргет.")
 
+    # --- Rows skipped by validation ---
+    if not dropped.empty:
+        with st.sidebar.expander(f"🧹 Пропущено строк: {len(dropped)}"):
+            st.dataframe(dropped, hide_index=True, use_container_width=True)
+
+    # --- Memory footprint ---
+    if not mem_report.empty:
+        with st.sidebar.expander("💾 Память"):
+            before_mb, after_mb = process_footprint(mem_report)
+            st.dataframe(mem_report.round(2), hide_index=True, use_container_width=True)
+            # Все сессии процесса читают одну копию из data plane: объем не растет с числом пользователей
+            cache = data_plane.cache_stats().get(branch, {})
+            st.caption(f"На процесс (общая копия для всех сессий): {before_mb:,.1f} МБ → {after_mb:,.1f} МБ".replace(",", " ")
+                       + (f" · кэш филиала {cache['mb']:,.1f} из {cache['max_mb']:,.0f} МБ".replace(",", " ") if cache else ""))
+
 if __name__ == "__main__":
     main()
@@ -0,0 +1,123 @@
+import json
+import os
+
+import changes
+import data_plane
+import refresher
+import workbooks
+
+# --- Branch registry ---
+# Branches (cities) and their workbooks come from branches.json, or the file
+# named by AURORA_BRANCHES: opening a city is a config change, not a code
+# change. A branch declares any of the workbooks below by sheet id (+ gid);
+# each app lists only the branches that have the workbook it shows.
+#
+# Each branch gets its own bounded cache of attached frames in the data plane
+# ("cache" at the top level, overridable per branch), so one busy branch
+# never evicts another branch's data.
+#
+# Every refresh also publishes its row-level changes against the snapshot it
+# replaces (changes.py), matching rows by the first usable key of DIFF_KEYS.
+#
+# "cogs_categories" lists the expense categories the simulator counts as cost
+# of goods for the branch (calibration.py; default calibration.COGS_KEYWORDS).
+
+CONFIG = os.environ.get("AURORA_BRANCHES", os.path.join(os.path.dirname(os.path.abspath(__file__)), "branches.json"))
+
+# kind -> (build factory taking the export url, refresh interval in seconds)
+WORKBOOKS = {
+    "pnl": (workbooks.pnl_builder, 300),
+    "fixed_costs": (workbooks.fixed_costs_builder, 600),
+    "catalog": (workbooks.catalog_builder, 600),
+    "sales": (workbooks.sales_builder, 300),
+}
+
+# Branch settings that are not workbooks
+SETTINGS = ("name", "cache", "cogs_categories")
+
+# kind -> key candidates identifying a row of its sheets
+DIFF_KEYS = {
+    "pnl": [["Месяц"]],
+    "fixed_costs": [["Расход"]],
+    "catalog": [["Название"]],
+    "sales": [["Manager", "Date"]],
+}
+
+
+def load(path=CONFIG):
+    """Parse and check the config; returns {"cache": {...}, "branches": {key: branch}}."""
+    with open(path, encoding="utf-8") as f:
+        config = json.load(f)
+    for key, branch in config.get("branches", {}).items():
+        if "name" not in branch:
+            raise ValueError(f"{path}: branch '{key}' has no name")
+        categories = branch.get("cogs_categories", [])
+        if not isinstance(categories, list) or not all(isinstance(c, str) and c.strip() for c in categories):
+            raise ValueError(f"{path}: branch '{key}': cogs_categories must be a list of category names")
+        for kind, spec in branch.items():
+            if kind in SETTINGS:
+                continue
+            if kind not in WORKBOOKS:
+                raise ValueError(f"{path}: branch '{key}': unknown workbook '{kind}' (expected {list(WORKBOOKS)})")
+            if "sheet_id" not in spec:
+                raise ValueError(f"{path}: branch '{key}': '{kind}' has no sheet_id")
+    return config
+
+
+_config = load()
+BRANCHES = _config["branches"]
+
+
+def url(key, kind):
+    spec = BRANCHES[key][kind]
+    return workbooks.export_url(spec["sheet_id"], spec.get("gid"))
+
+
+def with_workbook(kind):
+    """{display name: key} of branches that declare `kind`, in config order."""
+    return {branch["name"]: key for key, branch in BRANCHES.items() if kind in branch}
+
+
+def urls(kind=None):
+    """Export urls of every declared workbook (of one kind)."""
+    return [url(key, k) for key, branch in BRANCHES.items() for k in WORKBOOKS if k in branch and kind in (None, k)]
+
+
+def _build(key, kind):
+    builder, interval = WORKBOOKS[kind]
+    name = url(key, kind)
+    return name, changes.tracked(name, builder(name), DIFF_KEYS[kind]), interval
+
+
+def register(key, kind):
+    """Schedule background refresh of a branch workbook without waiting for it."""
+    return refresher.register(*_build(key, kind))
+
+
+def serve(key, kind):
+    """Frames of a branch workbook (refresher.serve: last good snapshot, revalidated in background)."""
+    return refresher.serve(*_build(key, kind))
+
+
+def version(key, kind):
+    return data_plane.version(url(key, kind))
+
+
+def find(text):
+    """Branch key for a key, display name ("🌸 Алматы" or "Алматы") or sales sheet id; None if unknown."""
+    text = str(text).strip().lower()
+    for key, branch in BRANCHES.items():
+        aliases = {key.lower(), branch["name"].lower(), branch["name"].split()[-1].lower()}
+        if "sales" in branch:
+            aliases.add(branch["sales"]["sheet_id"].lower())
+        if text in aliases:
+            return key
+    return None
+
+
+# One cache group per branch
+for _key, _branch in BRANCHES.items():
+    _bounds = {**_config.get("cache", {}), **_branch.get("cache", {})}
+    for _kind in WORKBOOKS:
+        if _kind in _branch:
+            data_plane.cache_group(url(_key, _kind), _key, **_bounds)
@@ -0,0 +1,48 @@
+# --- Break-even model (simulator) ---
+# Fixed monthly costs are covered by the margin each order leaves after
+# materials (avg_check / markup), packaging and commissions.
+
+NO_BREAK_EVEN = 999999  # orders shown when every order loses money
+DAYS = 30               # days per month in the model
+
+# Simulator inputs before the user (or an API query) changes them
+DEFAULTS = {
+    "target_daily": 5000,
+    "var_cost_per_order": 1000,
+    "avg_check": 15000,
+    "markup": 2.2,
+    "pct_kaspi": 0.95,
+    "pct_tax": 3.0,
+    "pct_florist": 2.0,
+    "pct_manager": 2.0,
+}
+
+
+def total_fixed_costs(base_fixed_costs, target_daily, extra=0):
+    """Fixed costs from the sheet + monthly ad spend + simulated extra."""
+    return base_fixed_costs + target_daily * DAYS + extra
+
+
+def break_even(fixed_costs, avg_check, markup, var_cost_per_order, commission_pct):
+    """
+    Returns dict: cogs, commission_money, margin_per_order, qty, revenue.
+    qty = NO_BREAK_EVEN and revenue = 0 when margin_per_order <= 0.
+    """
+    cogs = avg_check / markup
+    commission_money = avg_check * (commission_pct / 100)
+    margin_per_order = avg_check - cogs - var_cost_per_order - commission_money
+
+    if margin_per_order > 0:
+        qty = fixed_costs / margin_per_order
+        revenue = qty * avg_check
+    else:
+        qty = NO_BREAK_EVEN
+        revenue = 0
+
+    return {
+        "cogs": cogs,
+        "commission_money": commission_money,
+        "margin_per_order": margin_per_order,
+        "qty": qty,
+        "revenue": revenue,
+    }
@@ -1,15 +1,9 @@
 import streamlit as st
 import pandas as pd
-import plotly.graph_objects as go
-import ssl
-
-# Disable SSL verification for macOS
-try:
-    _create_unverified_https_context = ssl._create_unverified_context
-except AttributeError:
-    pass
-else:
-    ssl._create_default_https_context = _create_unverified_https_context
+
+import branches
+import pricing
+from freshness import show_data_age
 
 # --- Page Configuration ---
 st.set_page_config(
@@ -19,48 +13,34 @@ st.set_page_config(
 )
 
 # --- Constants ---
-SHEET_ID = "1NUpmMswEtKyX1AIeM9p1m8VHjWpPnR8VeJfr1m7Qgsg"
-GID = "680482883"
-EXPORT_URL = f"https://docs.google.com/spreadsheets/d/{SHEET_ID}/export?format=xlsx&gid={GID}"
-
-# --- Data Loading ---
-import requests
-import io
+CATALOG_BRANCHES = branches.with_workbook("catalog")  # branches.json
 
 # --- Data Loading ---
-@st.cache_data(ttl=600)  # Cache for 10 minutes
-def load_data():
+def load_data(branch):
+    """Catalog snapshot from the shared data plane (one copy for all sessions, revalidated in background every 10 minutes)."""
     try:
-        # Use requests to fetch data, which determines the file type
-        response = requests.get(EXPORT_URL, timeout=10)
-        response.raise_for_status() # Raise error for 400/500 codes
-        
-        # Load directly from bytes
-        df = pd.read_excel(io.BytesIO(response.content))
-        
-        # Verify columns exist
-        required_columns = ["Название", "Категория", "Себестоимость", "Цена_Базовая"]
-        missing = [col for col in required_columns if col not in df.columns]
-        if missing:
-            st.error(f"Missing columns in Google Sheet: {missing}")
-            return pd.DataFrame()
-            
-        # Select and Clean Data
-        df = df[required_columns]
-        df["Себестоимость"] = pd.to_numeric(df["Себестоимость"], errors='coerce').fillna(0)
-        df["Цена_Базовая"] = pd.to_numeric(df["Цена_Базовая"], errors='coerce').fillna(0)
-        
-        return df
+        frames = branches.serve(branch, "catalog")
+        return frames["catalog"]
     except Exception as e:
         st.error(f"Error loading data: {e}")
         return pd.DataFrame()
 
-df = load_data()
+# Заголовок рисуем до загрузки каталога: первый кадр не ждет скачивания таблицы
+st.title("🌸 Калькулятор Цветочного Комбо")
+
+if not CATALOG_BRANCHES:
+    st.error("Ни у одного филиала в branches.json нет каталога.")
+    st.stop()
+branch_name = st.sidebar.selectbox("Филиал", list(CATALOG_BRANCHES)) if len(CATALOG_BRANCHES) > 1 else next(iter(CATALOG_BRANCHES))
+branch = CATALOG_BRANCHES[branch_name]
+
+df = load_data(branch)
 
 if df.empty:
     st.stop()
 
 # --- Sidebar: Commissions ---
+show_data_age(branches.url(branch, "catalog"))
 st.sidebar.header("⚙️ Настройки Комиссий")
 
 # Defaults
@@ -75,11 +55,10 @@ pct_manager = st.sidebar.number_input("Менеджеру (%)", value=default_ma
 pct_tax = st.sidebar.number_input("Налог (%)", value=default_tax, min_value=0.0, step=0.5)
 
 total_commission_pct = pct_kaspi + pct_florist + pct_manager + pct_tax
+commission_rate = pricing.commission_rate(pct_kaspi, pct_florist, pct_manager, pct_tax)
 st.sidebar.markdown(f"**Всего комиссий: {total_commission_pct:.2f} %**")
 
 # --- Main Logic: Cart ---
-st.title("🌸 Калькулятор Цветочного Комбо")
-
 if 'cart' not in st.session_state:
     st.session_state.cart = []
 
@@ -111,16 +90,8 @@ if selected_item_name:
     st.info(f"Базовая цена: {base_price:,.0f} ₸".replace(",", " "))
 
     if st.button("Добавить в состав", type="primary"):
-        # Add to cart
-        cart_item = {
-            "Название": selected_item_name,
-            "Количество": quantity,
-            "Себестоимость_шт": item_row["Себестоимость"],
-            "Цена_Базовая_шт": item_row["Цена_Базовая"],
-            "Сумма_Себестоимости": item_row["Себестоимость"] * quantity,
-            "Сумма_Базовая": item_row["Цена_Базовая"] * quantity
-        }
-        st.session_state.cart.append(cart_item)
+        # Add to cart: the session keeps only name + quantity, prices come from the shared catalog
+        st.session_state.cart.append({"Название": selected_item_name, "Количество": quantity})
         st.rerun()
 
 # --- Section B: Cart Table ---
@@ -128,6 +99,23 @@ st.subheader("2. Состав Комбо")
 
 if st.session_state.cart:
     cart_df = pd.DataFrame(st.session_state.cart)
+    prices = df[["Название", "Себестоимость", "Цена_Базовая"]].astype({"Название": str}).drop_duplicates("Название")
+    cart_df = cart_df.merge(prices, on="Название", how="left", indicator=True)
+
+    # Позиции, которых больше нет в каталоге, не считаем по нулевой себестоимости — исключаем из расчета
+    missing = cart_df["_merge"] == "left_only"
+    if missing.any():
+        st.warning("Нет в каталоге, исключены из расчета: " + ", ".join(cart_df.loc[missing, "Название"].astype(str)))
+        cart_df = cart_df[~missing]
+        if cart_df.empty:
+            if st.button("Очистить корзину"):
+                st.session_state.cart = []
+                st.rerun()
+            st.stop()
+    cart_df = cart_df.drop(columns="_merge").fillna({"Себестоимость": 0, "Цена_Базовая": 0})
+    cart_df["Себестоимость_шт"] = cart_df["Себестоимость"]
+    cart_df["Сумма_Себестоимости"] = cart_df["Себестоимость"] * cart_df["Количество"]
+    cart_df["Сумма_Базовая"] = cart_df["Цена_Базовая"] * cart_df["Количество"]
     
     # Display table with formatting
     display_df = cart_df[["Название", "Количество", "Себестоимость_шт", "Сумма_Себестоимости", "Сумма_Базовая"]].copy()
@@ -157,35 +145,51 @@ if st.session_state.cart:
     # --- Section 3: Final Calculation ---
     st.subheader("3. Финальный Расчет и Накрутка")
     
+    pricing_mode = st.radio("Режим", ["Ручная цена", "Подбор цены"], horizontal=True,
+                            help="Подбор: минимальная цена, дающая нужную прибыль или накрутку после комиссий")
+    
     col_calc1, col_calc2 = st.columns(2)
     
-    with col_calc1:
-        target_markup = st.slider("Желаемая накрутка (от себестоимости)", min_value=1.5, max_value=4.0, value=2.5, step=0.1)
-        suggested_price = total_material_cost * target_markup
-        st.caption(f"Рекомендуемая цена (Себ. x {target_markup:.1f}): **{suggested_price:,.0f} ₸**")
-
-    with col_calc2:
-        final_price = st.number_input(
-            "ИТОГОВАЯ ЦЕНА ПРОДАЖИ (₸)",
-            value=float(suggested_price) if 'suggested_price' in locals() else float(total_base_price_sum), 
-            step=100.0,
-            format="%.0f"
-        )
+    if pricing_mode == "Ручная цена":
+        with col_calc1:
+            target_markup = st.slider("Желаемая накрутка (от себестоимости)", min_value=1.5, max_value=4.0, value=2.5, step=0.1)
+            suggested_price = total_material_cost * target_markup
+            st.caption(f"Рекомендуемая цена (Себ. x {target_markup:.1f}): **{suggested_price:,.0f} ₸**")
+
+        with col_calc2:
+            final_price = st.number_input(
+                "ИТОГОВАЯ ЦЕНА ПРОДАЖИ (₸)",
+                value=float(suggested_price) if 'suggested_price' in locals() else float(total_base_price_sum), 
+                step=100.0,
+                format="%.0f"
+            )
+    else:
+        with col_calc1:
+            target_kind = st.radio("Цель", ["Чистая прибыль (₸)", "Накрутка (Net)"], horizontal=True)
+            if target_kind == "Чистая прибыль (₸)":
+                target_value = st.number_input("Желаемая чистая прибыль (₸)", value=float(total_material_cost), step=500.0, format="%.0f")
+                exact_price = float(pricing.price_for_profit(total_material_cost, target_value, commission_rate))
+            else:
+                target_value = st.number_input("Желаемая накрутка (Net)", value=2.0, min_value=0.1, step=0.1)
+                exact_price = float(pricing.price_for_net_markup(total_material_cost, target_value, commission_rate))
+
+        with col_calc2:
+            if exact_price != exact_price:  # NaN
+                st.error("Цель недостижима при текущих комиссиях.")
+                st.stop()
+            final_price = float(pricing.round_price(exact_price))
+            st.metric("Минимальная цена", f"{final_price:,.0f} ₸".replace(",", " "),
+                      f"точно: {exact_price:,.0f} ₸".replace(",", " "), delta_color="off")
     
     # Calculations
-    commission_cost = final_price * (total_commission_pct / 100)
-    total_expenses = total_material_cost + commission_cost
-    net_profit = final_price - total_expenses
+    metrics = pricing.cart_metrics(final_price, total_material_cost, commission_rate)
+    commission_cost = float(metrics["commission"])
+    total_expenses = float(metrics["expenses"])
+    net_profit = float(metrics["net_profit"])
     
     # Markup Metrics
-    gross_markup = 0.0
-    net_markup = 0.0
-    
-    if total_material_cost > 0:
-        gross_markup = final_price / total_material_cost
-        
-    if total_expenses > 0:
-        net_markup = final_price / total_expenses
+    gross_markup = float(metrics["gross_markup"])
+    net_markup = float(metrics["net_markup"])
 
     # Metrics Display
     st.markdown("### 📊 Результаты")
@@ -207,6 +211,7 @@ if st.session_state.cart:
         st.error(f"⚠️ УБЫТОК: {net_profit:,.0f} ₸")
     
     # Chart
+    import plotly.graph_objects as go  # deferred until there is something to plot
     fig = go.Figure()
     
     fig.add_trace(go.Bar(
@@ -248,6 +253,57 @@ if st.session_state.cart:
     
     st.plotly_chart(fig)
 
+    # --- Price grid: profit across markups in one pass ---
+    with st.expander("📐 Прибыль по сетке накруток"):
+        grid = pricing.price_grid(total_material_cost, commission_rate)
+        st.dataframe(
+            grid,
+            column_config={
+                "Накрутка": st.column_config.NumberColumn(format="%.1fx"),
+                "Цена": st.column_config.NumberColumn(format="%.0f ₸"),
+                "Комиссии": st.column_config.NumberColumn(format="%.0f ₸"),
+                "Чистая прибыль": st.column_config.NumberColumn(format="%.0f ₸"),
+                "Накрутка (Net)": st.column_config.NumberColumn(format="%.2fx"),
+            },
+            use_container_width=True,
+            hide_index=True
+        )
+
+    # --- Batch: price several combos at once ---
+    with st.expander("🧺 Пакетный подбор цен"):
+        st.caption("Впишите себестоимость нескольких комбо — цена подберётся для всех сразу.")
+        b1, b2 = st.columns(2)
+        batch_kind = b1.radio("Цель", ["Чистая прибыль (₸)", "Накрутка (Net)"], key="batch_kind", horizontal=True)
+        if batch_kind == "Чистая прибыль (₸)":
+            batch_target = b2.number_input("Прибыль с комбо (₸)", value=5000.0, step=500.0, format="%.0f", key="batch_target")
+        else:
+            batch_target = b2.number_input("Накрутка (Net)", value=2.0, min_value=0.1, step=0.1, key="batch_markup")
+
+        carts = st.data_editor(
+            pd.DataFrame({"Комбо": ["Текущая корзина"], "Себестоимость": [float(total_material_cost)]}),
+            num_rows="dynamic",
+            use_container_width=True,
+            hide_index=True,
+            key="batch_carts"
+        )
+        carts = carts.dropna(subset=["Себестоимость"])
+        if not carts.empty:
+            priced = pricing.solve_batch(carts, commission_rate, batch_target,
+                                         mode="profit" if batch_kind == "Чистая прибыль (₸)" else "net_markup")
+            st.dataframe(
+                priced,
+                column_config={
+                    "Себестоимость": st.column_config.NumberColumn(format="%.0f ₸"),
+                    "Мин. цена": st.column_config.NumberColumn(format="%.0f ₸"),
+                    "Цена": st.column_config.NumberColumn(format="%.0f ₸"),
+                    "Чистая прибыль": st.column_config.NumberColumn(format="%.0f ₸"),
+                    "Накрутка (Gross)": st.column_config.NumberColumn(format="%.2fx"),
+                    "Накрутка (Net)": st.column_config.NumberColumn(format="%.2fx"),
+                },
+                use_container_width=True,
+                hide_index=True
+            )
+
 else:
     st.info("Корзина пуста. Добавьте товары, чтобы увидеть расчет.")
 
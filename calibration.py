@@ -0,0 +1,142 @@
+import threading
+
+import pandas as pd
+
+import changes
+from workbooks import get_russian_month_name
+
+# --- Calibration of simulator assumptions ---
+# Actual average check, effective markup and daily ad spend per month, from
+# the P&L workbook (expenses, 'Таргет', monthly sales) and the managers' sales
+# sheets. All sources are stacked into one long frame of (month, metric,
+# value) facts and pivoted once.
+#
+# recalibrate() keeps the last table per key and, on new snapshots, recomputes
+# only the months their change logs touched.
+#
+# Cost of goods is the sum of the expense categories a branch names in
+# branches.json ("cogs_categories"); the table lists which categories each
+# month actually counted, so a miss shows up instead of a silent zero.
+
+# Default cost-of-goods categories (materials); matched as case-insensitive substrings
+COGS_KEYWORDS = ("цвет", "закуп", "материал")
+
+MONTH_ORDER = [get_russian_month_name(pd.Timestamp(2000, m, 1)) for m in range(1, 13)]
+
+COLUMNS = ['Месяц', 'Выручка', 'Заказы', 'Ср. чек', 'Себестоимость', 'Категории себестоимости',
+           'Накрутка', 'Таргет', 'Таргет в день']
+
+_lock = threading.Lock()
+_tables = {}  # key -> ({source: snapshot created}, table)
+
+
+def _facts(frame, month, value, metric):
+    return pd.DataFrame({'Месяц': frame[month].astype(str), 'metric': metric, 'value': frame[value].astype(float)})
+
+
+def calibrate(expenses, target, pnl_sales, city_sales, cogs_categories=COGS_KEYWORDS):
+    """
+    expenses / target / pnl_sales: P&L frames ('Лист1', 'Таргет', 'Продажи по месяцам').
+    city_sales: manager rows of all cities (Date, Revenue, Orders).
+    cogs_categories: expense categories counted as cost of goods (substrings).
+    Returns one row per month with COLUMNS; NaN where a source has no data.
+    """
+    parts = []
+    cogs_names = pd.Series(dtype=object)
+    if not expenses.empty and 'Месяц' in expenses.columns:
+        keywords = [k.lower() for k in cogs_categories]
+        category = expenses['Категория'].astype(str)
+        cogs = expenses[category.str.lower().map(lambda c: any(k in c for k in keywords))]
+        parts.append(_facts(cogs, 'Месяц', 'Сумма', 'cogs'))
+        cogs_names = cogs.groupby(cogs['Месяц'].astype(str))['Категория'].agg(
+            lambda c: ', '.join(sorted(set(c.astype(str)))))
+    if not target.empty and 'Месяц' in target.columns:
+        parts.append(_facts(target, 'Месяц', 'Сумма', 'ads'))
+        # Days the ad budget covers: the whole month, or up to the last entry for the running month
+        dated = target.dropna(subset=['Дата'])
+        if not dated.empty:
+            last = dated['Дата'].max()
+            days = dated.drop_duplicates('Месяц').assign(days=lambda d: d['Дата'].dt.days_in_month)
+            days.loc[days['Дата'].dt.to_period('M') == last.to_period('M'), 'days'] = last.day
+            parts.append(_facts(days, 'Месяц', 'days', 'days'))
+    if not pnl_sales.empty and 'Сумма продаж' in pnl_sales.columns:
+        parts.append(_facts(pnl_sales, 'Месяц', 'Сумма продаж', 'revenue'))
+    if not city_sales.empty:
+        sales = city_sales.assign(Месяц=city_sales['Date'].map(get_russian_month_name))
+        parts.append(_facts(sales, 'Месяц', 'Revenue', 'sales_revenue'))
+        parts.append(_facts(sales, 'Месяц', 'Orders', 'orders'))
+
+    if not parts:
+        return pd.DataFrame(columns=COLUMNS)
+
+    facts = pd.concat(parts, ignore_index=True)
+    facts = facts[facts['Месяц'].notna() & (facts['Месяц'] != 'None')]
+    table = facts.pivot_table(index='Месяц', columns='metric', values='value', aggfunc='sum', sort=False)
+    table = table.reindex(columns=['cogs', 'ads', 'days', 'revenue', 'sales_revenue', 'orders'])
+
+    # P&L revenue is authoritative; fall back to the managers' sheets
+    revenue = table['revenue'].fillna(table['sales_revenue'])
+    orders = table['orders'].where(table['orders'] > 0)
+    cogs = table['cogs'].where(table['cogs'] > 0)
+    result = pd.DataFrame({
+        'Выручка': revenue,
+        'Заказы': table['orders'],
+        'Ср. чек': table['sales_revenue'] / orders,
+        'Себестоимость': table['cogs'],
+        'Категории себестоимости': cogs_names.reindex(table.index),
+        'Накрутка': revenue / cogs,
+        'Таргет': table['ads'],
+        'Таргет в день': table['ads'] / table['days'].fillna(30),
+    })
+    result = result.reindex([m for m in MONTH_ORDER if m in result.index])
+    return result.rename_axis('Месяц').reset_index()[COLUMNS]
+
+
+def _in_months(frame, months):
+    if frame.empty:
+        return frame
+    if 'Месяц' in frame.columns:
+        return frame[frame['Месяц'].astype(str).isin(months)]
+    return frame[frame['Date'].dt.month.map(dict(enumerate(MONTH_ORDER, 1))).isin(months)]
+
+
+def recalibrate(key, sources, expenses, target, pnl_sales, city_sales, cogs_categories=COGS_KEYWORDS):
+    """
+    calibrate() that reuses the previous table of `key` and recomputes only
+    the months changed since. sources: {workbook: (snapshot created, change
+    log)} of every snapshot the inputs come from.
+    """
+    with _lock:
+        previous = _tables.get(key)
+
+    months = set()
+    if previous is None or set(previous[0]) != set(sources):
+        months = None
+    else:
+        for name, (created, log) in sources.items():
+            since = previous[0][name]
+            touched = set() if created == since else changes.touched_months(log, since)
+            if touched is None:
+                months = None
+                break
+            months |= touched
+
+    if months is None:
+        table = calibrate(expenses, target, pnl_sales, city_sales, cogs_categories)
+    elif not months:
+        table = previous[1]
+    else:
+        # The running month's ad days depend on the last 'Таргет' entry: it and the previous one are always redone
+        months |= set(previous[1]['Месяц'].tail(1))
+        if not target.empty and 'Дата' in target.columns and target['Дата'].notna().any():
+            months.add(get_russian_month_name(target['Дата'].max()))
+        fresh = calibrate(*(_in_months(frame, months) for frame in (expenses, target, pnl_sales, city_sales)),
+                          cogs_categories)
+        kept = previous[1][~previous[1]['Месяц'].isin(months)]
+        table = pd.concat([kept, fresh], ignore_index=True) if not kept.empty else fresh
+        table = table.set_index('Месяц').reindex([m for m in MONTH_ORDER if m in set(table['Месяц'])])
+        table = table.rename_axis('Месяц').reset_index()[COLUMNS]
+
+    with _lock:
+        _tables[key] = ({name: created for name, (created, _) in sources.items()}, table)
+    return table
@@ -0,0 +1,195 @@
+import time
+
+import pandas as pd
+
+import data_plane
+from workbooks import CHANGES_SHEET, SERVICE_SHEETS, get_russian_month_name
+
+# --- Row-level changes between snapshots ---
+# Every refresh diffs the new frames against the snapshot it replaces and
+# publishes the result with it as the CHANGES_SHEET frame, one row per change:
+#
+#   Лист, Изменение (добавлено / удалено / изменено), Ключ, Поле, Было, Стало, Месяц, Обнаружено
+#
+# A sheet is matched by the first of its workbook's key candidates that is
+# unique in both versions (a manager-day, a month, a product...), which also
+# yields per-field edits; otherwise rows are matched by content.
+#
+# The frame is a log, newest first: each refresh prepends its changes to the
+# previous snapshot's log and drops those older than LOG_SECONDS. A consumer
+# that remembers when its last input snapshot was created recomputes only the
+# months changed since (touched_months).
+
+COLUMNS = ['Лист', 'Изменение', 'Ключ', 'Поле', 'Было', 'Стало', 'Месяц', 'Обнаружено']
+MAX_ROWS = 5000    # per sheet and refresh; a rewritten sheet is summarized by its first rows
+MAX_LOG = 20000    # rows kept in the log
+LOG_SECONDS = 24 * 3600
+
+
+def _comparable(df, columns):
+    """Values that compare equal across versions even if compaction picked other dtypes."""
+    out = {}
+    for col in columns:
+        s = df[col]
+        if pd.api.types.is_numeric_dtype(s) and not pd.api.types.is_bool_dtype(s):
+            out[col] = s.astype('float64')
+        elif pd.api.types.is_datetime64_any_dtype(s):
+            out[col] = s
+        else:
+            out[col] = s.astype(str)
+    return pd.DataFrame(out, index=df.index)
+
+
+def row_diff(old, new, columns):
+    """
+    (added, removed): rows of `new` not in `old` and vice versa, matched as
+    multisets of whole rows over `columns`. Vectorized: one hash per row.
+    """
+    old_hash = pd.util.hash_pandas_object(_comparable(old, columns), index=False)
+    new_hash = pd.util.hash_pandas_object(_comparable(new, columns), index=False)
+    surplus = new_hash.value_counts().sub(old_hash.value_counts(), fill_value=0)
+
+    def pick(frame, hashes, counts):
+        # keep the first `counts[h]` occurrences of each hash h
+        wanted = hashes.map(counts).fillna(0).to_numpy()
+        nth = hashes.groupby(hashes.to_numpy()).cumcount().to_numpy()
+        return frame[nth < wanted]
+
+    return pick(new, new_hash, surplus.clip(lower=0)), pick(old, old_hash, (-surplus).clip(lower=0))
+
+
+def _month(frame):
+    if 'Месяц' in frame.columns:
+        return frame['Месяц'].astype(str).where(frame['Месяц'].notna())
+    for col in ('Date', 'Дата'):
+        if col in frame.columns:
+            return frame[col].map(get_russian_month_name)
+    return pd.Series(None, index=frame.index, dtype=object)
+
+
+def _text(s):
+    """Display strings for changed values only (few rows): 1 234 000, 14.02.2026."""
+    if pd.api.types.is_datetime64_any_dtype(s):
+        return s.dt.strftime('%d.%m.%Y').fillna('')
+    if pd.api.types.is_numeric_dtype(s) and not pd.api.types.is_bool_dtype(s):
+        return s.map(lambda v: '' if pd.isna(v) else f"{v:,.{0 if float(v).is_integer() else 2}f}".replace(',', ' '))
+    return s.astype(str).where(s.notna(), '')
+
+
+def _label(frame, columns):
+    if frame.empty:
+        return pd.Series(dtype=str)
+    text = pd.DataFrame({col: _text(frame[col]) for col in columns}, index=frame.index)
+    return text.apply(' · '.join, axis=1)
+
+
+def _rows(sheet, kind, frame, key_columns, value_columns):
+    """Whole added / removed rows -> long change rows (Поле empty, values in Было/Стало)."""
+    if frame.empty:
+        return []
+    frame = frame.head(MAX_ROWS)
+    summary = _label(frame, value_columns)
+    return [pd.DataFrame({
+        'Лист': sheet, 'Изменение': kind, 'Ключ': _label(frame, key_columns or value_columns),
+        'Поле': '', 'Было': summary if kind == 'удалено' else '', 'Стало': summary if kind == 'добавлено' else '',
+        'Месяц': _month(frame),
+    })]
+
+
+def _usable_key(old, new, candidates):
+    for key in candidates:
+        if all(k in old.columns and k in new.columns for k in key) \
+                and not old.duplicated(key).any() and not new.duplicated(key).any():
+            return list(key)
+    return None
+
+
+def diff_sheet(sheet, old, new, keys=()):
+    """Long change rows (COLUMNS without Обнаружено) for one sheet."""
+    columns = [c for c in new.columns if c in old.columns]
+    if not columns:
+        # A side without (shared) columns: a sheet with bad headers is stored column-less
+        return (_rows(sheet, 'добавлено', new, None, list(new.columns)) +
+                _rows(sheet, 'удалено', old, None, list(old.columns)))
+    key = _usable_key(old, new, keys)
+    if key is None:
+        added, removed = row_diff(old, new, columns)
+        return _rows(sheet, 'добавлено', added, None, columns) + _rows(sheet, 'удалено', removed, None, columns)
+
+    values = [c for c in columns if c not in key]
+    merged = _comparable(old, columns).merge(_comparable(new, columns), on=key, how='outer',
+                                             suffixes=('_old', '_new'), indicator=True)
+    parts = []
+    for kind, side, rows in (('добавлено', 'right_only', new), ('удалено', 'left_only', old)):
+        only = pd.MultiIndex.from_frame(merged.loc[merged['_merge'] == side, key])
+        picked = rows[pd.MultiIndex.from_frame(_comparable(rows, key)).isin(only)]
+        parts += _rows(sheet, kind, picked, key, columns)
+
+    both = merged[merged['_merge'] == 'both']
+    for col in values:
+        was, now = both[f'{col}_old'], both[f'{col}_new']
+        edited = both[~((was == now) | (was.isna() & now.isna()))].head(MAX_ROWS)
+        if edited.empty:
+            continue
+        parts.append(pd.DataFrame({
+            'Лист': sheet, 'Изменение': 'изменено', 'Ключ': _label(edited, key), 'Поле': col,
+            'Было': _text(edited[f'{col}_old']), 'Стало': _text(edited[f'{col}_new']),
+            'Месяц': _month(edited.rename(columns={f'{c}_new': c for c in values})),
+        }))
+    return parts
+
+
+def diff_workbook(old, new, keys=()):
+    """All changes between two {sheet: DataFrame} snapshots; sheets added or dropped count as whole."""
+    if old is None:
+        return pd.DataFrame(columns=COLUMNS)
+    parts = []
+    for sheet in set(old) | set(new):
+        if sheet in SERVICE_SHEETS:
+            continue
+        before = old.get(sheet, new.get(sheet, pd.DataFrame()).head(0))
+        after = new.get(sheet, before.head(0))
+        parts += diff_sheet(sheet, before, after, keys)
+    if not parts:
+        return pd.DataFrame(columns=COLUMNS)
+    found = pd.concat(parts, ignore_index=True).assign(Обнаружено=time.time())
+    return found.astype({'Ключ': str, 'Поле': str, 'Было': str, 'Стало': str, 'Месяц': object})[COLUMNS]
+
+
+def _append(log, found):
+    if log is None or log.empty:
+        return found
+    if not found.empty:
+        log = pd.concat([found, log], ignore_index=True)
+    return log[log['Обнаружено'] >= time.time() - LOG_SECONDS].head(MAX_LOG).reset_index(drop=True)
+
+
+def tracked(name, build, keys=()):
+    """build() for the refresher that also publishes the change log against the current snapshot of `name`."""
+    def run():
+        frames = build()
+        old = data_plane.attach(name)
+        found = diff_workbook(old, frames, keys)
+        frames[CHANGES_SHEET] = _append(old.get(CHANGES_SHEET) if old is not None else None, found)
+        return frames
+    return run
+
+
+def latest(log):
+    """Changes found by the most recent refresh that changed anything."""
+    if log is None or log.empty:
+        return pd.DataFrame(columns=COLUMNS)
+    return log[log['Обнаружено'] == log['Обнаружено'].max()]
+
+
+def touched_months(log, since):
+    """
+    Months changed after `since` (epoch seconds: when the consumer's previous
+    input snapshot was created); None when the log can't tell: recompute all.
+    """
+    if log is None or since < time.time() - LOG_SECONDS:
+        return None
+    if len(log) >= MAX_LOG and since < log['Обнаружено'].min():
+        return None  # trimmed by size
+    months = log.loc[log['Обнаружено'] > since, 'Месяц']
+    return None if months.isna().any() else set(months)
@@ -0,0 +1,101 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+from loadtest import FIXTURE_BRANCHES, fixture_workbooks, serve_fixtures
+
+# --- Cold start budget ---
+# Runs each app in a fresh interpreter (streamlit.testing's AppTest, against the
+# loadtest Google Sheets stand-in and an empty data plane) and checks:
+#   1. heavy modules (plotly.express, openpyxl, requests) are not imported
+#      before the first paint - they must stay lazy, inside the code that uses them;
+#   2. the time from the start of the script run to its first element stays
+#      within the app's budget (best of RUNS).
+# Streamlit itself is already imported then, as it is in a running server.
+# Exit code 1 on any regression, so it can run in CI: `python check_startup.py`
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+RUNS = 5
+DAYS = 60  # days of fixture data
+
+# Seconds to the first element: the slowest of a few runs on the dev container + ~0.3 s
+FIRST_PAINT_BUDGET = {
+    "app.py": 1.0,          # measured 0.51-0.70 s
+    "calculator.py": 1.2,   # 0.57-0.88 s
+    "simulator.py": 1.0,    # 0.53-0.74 s
+    "sales_report.py": 1.0, # 0.61-0.72 s
+}
+
+LAZY_MODULES = ["plotly.express", "openpyxl", "requests"]
+
+# The first delta the script sends (hidden <style> blocks don't count) stops the clock
+_PROBE = """
+import json, sys, time
+from streamlit.runtime.scriptrunner_utils.script_run_context import ScriptRunContext
+from streamlit.testing.v1 import AppTest
+
+lazy = json.loads(sys.argv[2])
+preloaded = {m for m in lazy if m in sys.modules}
+first = {}
+enqueue = ScriptRunContext.enqueue
+
+def timed_enqueue(self, msg):
+    if not first and msg.WhichOneof("type") == "delta":
+        body = msg.delta.new_element.markdown.body if msg.delta.HasField("new_element") else ""
+        if not body.lstrip().startswith("<style"):
+            first["seconds"] = time.perf_counter() - start
+            first["loaded"] = [m for m in lazy if m in sys.modules and m not in preloaded]
+    enqueue(self, msg)
+
+ScriptRunContext.enqueue = timed_enqueue
+at = AppTest.from_file(sys.argv[1], default_timeout=120)
+start = time.perf_counter()
+at.run()
+errors = [str(e.value) for e in at.exception]
+print(json.dumps({"seconds": first.get("seconds"), "loaded": first.get("loaded", []), "errors": errors}))
+"""
+
+
+def measure(app, env):
+    results = []
+    for _ in range(RUNS):
+        with tempfile.TemporaryDirectory(prefix="aurora_startup_") as run_dir:
+            out = subprocess.run(
+                [sys.executable, "-c", _PROBE, os.path.join(ROOT, app), json.dumps(LAZY_MODULES)],
+                cwd=ROOT, capture_output=True, text=True, check=True,
+                env={**env, "AURORA_DATA_DIR": os.path.join(run_dir, "data"),
+                     "AURORA_SALES_INBOX": os.path.join(run_dir, "inbox")}
+            )
+        results.append(json.loads(out.stdout.strip().splitlines()[-1]))
+    if any(r["seconds"] is None or r["errors"] for r in results):
+        errors = [e for r in results for e in r["errors"]]
+        return float("inf"), [], errors or ["no element rendered"]
+    best = min(r["seconds"] for r in results)
+    return best, results[0]["loaded"], []
+
+
+def main():
+    base = serve_fixtures(fixture_workbooks(DAYS))
+    failed = False
+    with tempfile.TemporaryDirectory(prefix="aurora_startup_") as tmp:
+        config = os.path.join(tmp, "branches.json")
+        with open(config, "w", encoding="utf-8") as f:
+            json.dump({"branches": FIXTURE_BRANCHES}, f, ensure_ascii=False)
+        # Port 0: the apps' sales endpoint binds any free port, never a running server's one
+        env = {**os.environ, "AURORA_SHEETS_BASE": base, "AURORA_BRANCHES": config, "AURORA_SALES_PORT": "0"}
+
+        for app, budget in FIRST_PAINT_BUDGET.items():
+            seconds, loaded, errors = measure(app, env)
+            ok = seconds <= budget and not loaded and not errors
+            failed |= not ok
+            status = "OK  " if ok else "FAIL"
+            print(f"{status} {app:<16} {seconds:.2f} s (budget {budget:.2f} s)"
+                  + (f", eager: {', '.join(loaded)}" if loaded else "")
+                  + (f", errors: {'; '.join(errors)}" if errors else ""))
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,222 @@
+import pandas as pd
+import pyarrow as pa
+import contextlib
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process locking
+    fcntl = None
+
+# --- Shared read-only data plane ---
+# Parsed workbooks are written once as Arrow IPC files under DATA_DIR. Every
+# Streamlit session and every server process attaches to the same files via
+# memory maps: the OS page cache holds one copy of the data, and each process
+# keeps a single set of DataFrames shared by all of its sessions.
+#
+# Frames returned by attach() are shared: treat them as read-only (numeric
+# columns backed by the map are not writable).
+#
+# Attached frames are held in size-bounded LRU caches, one per cache group
+# (a branch), so a busy branch with large workbooks evicts only its own
+# frames. An evicted workbook is simply mapped again on the next attach.
+
+DATA_DIR = os.environ.get("AURORA_DATA_DIR", os.path.join(tempfile.gettempdir(), "aurora_data_plane"))
+KEEP_VERSIONS = 2  # current + previous, so readers mid-attach never lose files
+CACHE_MB = 256      # default budget of attached frames per cache group
+CACHE_ENTRIES = 16  # default max workbooks per cache group
+
+_lock = threading.Lock()
+_caches = {}  # group -> _LRU
+_groups = {}  # name -> group ("" unless assigned)
+
+
+class _LRU:
+    """Attached workbooks of one cache group: name -> (version, frames, bytes)."""
+
+    def __init__(self, max_mb, max_entries):
+        self.max_bytes = max_mb * 2**20
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.bytes = 0
+
+    def get(self, name, version):
+        entry = self.entries.get(name)
+        if entry is None or entry[0] != version:
+            return None
+        self.entries.move_to_end(name)
+        return entry[1]
+
+    def put(self, name, version, frames):
+        old = self.entries.pop(name, None)
+        if old:
+            self.bytes -= old[2]
+        size = sum(int(df.memory_usage(deep=True).sum()) for df in frames.values())
+        self.entries[name] = (version, frames, size)
+        self.bytes += size
+        # The entry just attached always stays, even if it alone exceeds the budget
+        while len(self.entries) > 1 and (self.bytes > self.max_bytes or len(self.entries) > self.max_entries):
+            _, (_, _, evicted) = self.entries.popitem(last=False)
+            self.bytes -= evicted
+
+    def stats(self):
+        return {"entries": len(self.entries), "mb": self.bytes / 2**20,
+                "max_mb": self.max_bytes / 2**20, "max_entries": self.max_entries}
+
+
+def cache_group(name, group, max_mb=CACHE_MB, max_entries=CACHE_ENTRIES):
+    """Attach workbook `name` through the LRU of `group` (created with the given bounds on first use)."""
+    with _lock:
+        _groups[name] = group
+        if group not in _caches:
+            _caches[group] = _LRU(max_mb, max_entries)
+
+
+def cache_stats():
+    """{group: {"entries", "mb", "max_mb", "max_entries"}} of this process."""
+    with _lock:
+        return {group: cache.stats() for group, cache in _caches.items()}
+
+
+def _cache_for(name):
+    group = _groups.get(name, "")
+    if group not in _caches:
+        _caches[group] = _LRU(CACHE_MB, CACHE_ENTRIES)
+    return _caches[group]
+
+
+def _workbook_dir(name):
+    return os.path.join(DATA_DIR, hashlib.sha1(name.encode()).hexdigest()[:16])
+
+
+def _write_atomic(path, data):
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path))
+    with os.fdopen(fd, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def _arrow_safe(df):
+    """Stringify object columns Arrow can't type (mixed ints/strings from Excel)."""
+    fixed = {}
+    for col in df.columns:
+        s = df[col]
+        if s.dtype != object:
+            continue
+        try:
+            pa.array(s, from_pandas=True)
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            fixed[col] = s.map(lambda v: v if pd.isna(v) else str(v))
+    return df.assign(**fixed) if fixed else df
+
+
+def _read_frame(path):
+    source = pa.memory_map(path, "r")
+    table = pa.ipc.open_file(source).read_all()
+    # split_blocks avoids consolidating columns into new 2D blocks (extra copy)
+    return table.to_pandas(split_blocks=True)
+
+
+def publish(name, frames):
+    """
+    Store frames ({sheet: DataFrame}) as the new version of workbook `name`.
+    Readers switch over atomically when the CURRENT pointer is replaced.
+    """
+    version = f"{time.time_ns():x}"
+    root = _workbook_dir(name)
+    version_dir = os.path.join(root, version)
+    os.makedirs(version_dir, exist_ok=True)
+
+    sheets = []
+    for i, (sheet, df) in enumerate(frames.items()):
+        filename = f"{i:03d}.arrow"
+        table = pa.Table.from_pandas(_arrow_safe(df))
+        with pa.OSFile(os.path.join(version_dir, filename), "wb") as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+        sheets.append([sheet, filename])
+
+    manifest = {"name": name, "version": version, "created": time.time(), "sheets": sheets}
+    _write_atomic(os.path.join(version_dir, "manifest.json"), json.dumps(manifest, ensure_ascii=False).encode())
+    _write_atomic(os.path.join(root, "CURRENT"), version.encode())
+
+    # Drop old versions (files still mapped by other processes stay readable on POSIX)
+    versions = sorted(v for v in os.listdir(root) if v != "CURRENT" and os.path.isdir(os.path.join(root, v)))
+    for old in versions[:-KEEP_VERSIONS]:
+        shutil.rmtree(os.path.join(root, old), ignore_errors=True)
+    return version
+
+
+def current(name):
+    """Manifest of the current version of `name`, or None if never published."""
+    root = _workbook_dir(name)
+    try:
+        with open(os.path.join(root, "CURRENT")) as f:
+            version = f.read().strip()
+        with open(os.path.join(root, version, "manifest.json"), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def version(name):
+    """Current version id of `name` (None if never published); changes on every publish."""
+    manifest = current(name)
+    return manifest["version"] if manifest else None
+
+
+def attach(name, max_age=None):
+    """
+    Frames of the current version, mapped once per process (while in its group's cache).
+    Returns None if nothing is published or the version is older than max_age seconds.
+    """
+    manifest = current(name)
+    if manifest is None:
+        return None
+    if max_age is not None and time.time() - manifest["created"] > max_age:
+        return None
+
+    with _lock:
+        cached = _cache_for(name).get(name, manifest["version"])
+    if cached is not None:
+        return cached
+
+    version_dir = os.path.join(_workbook_dir(name), manifest["version"])
+    try:
+        frames = {sheet: _read_frame(os.path.join(version_dir, filename)) for sheet, filename in manifest["sheets"]}
+    except (OSError, pa.ArrowInvalid):
+        return None  # version pruned between reading CURRENT and the files
+
+    with _lock:
+        _cache_for(name).put(name, manifest["version"], frames)
+    return frames
+
+
+@contextlib.contextmanager
+def lock(name, blocking=False):
+    """
+    Cross-process lock for refreshing `name`.
+    Yields True if acquired, False if another process holds it (non-blocking mode).
+    """
+    root = _workbook_dir(name)
+    os.makedirs(root, exist_ok=True)
+    if fcntl is None:
+        yield True
+        return
+    with open(os.path.join(root, "LOCK"), "w") as f:
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
@@ -0,0 +1,76 @@
+import numpy as np
+import pandas as pd
+import math
+
+# --- Month-end revenue forecast ---
+# Daily revenue of every group (city, manager, ...) is laid out as one
+# groups x days-of-month matrix, so all groups are fitted in a single
+# vectorized pass. Each group's month-to-date days (up to the last reported
+# day of its scope, days without sales count as 0) give the mean and spread
+# of daily revenue; the remaining days are projected as a sum of independent
+# days plus the uncertainty of the mean itself:
+#   forecast = observed + mean * left
+#   sd       = std * sqrt(left + left^2 / elapsed)
+
+Z = {0.8: 1.2816, 0.9: 1.6449, 0.95: 1.9600}
+
+_erf = np.frompyfunc(math.erf, 1, 1)
+
+
+def normal_cdf(x):
+    return 0.5 * (1 + np.asarray(_erf(np.asarray(x, dtype=float) / math.sqrt(2)), dtype=float))
+
+
+def project(daily, keys, scope=None, level=0.9):
+    """
+    daily: long frame with `keys` + Date + Revenue (one month per scope).
+    scope: key columns sharing one "as of" date (e.g. ['City']); whole frame if None.
+    Returns one row per group: keys, Observed, Elapsed, DaysLeft, Forecast, Low, High, Std.
+    """
+    columns = list(keys) + ['Observed', 'Elapsed', 'DaysLeft', 'Forecast', 'Low', 'High', 'Std']
+    if daily.empty:
+        return pd.DataFrame(columns=columns)
+
+    daily = daily.assign(Day=daily['Date'].dt.day)
+    matrix = daily.pivot_table(index=keys, columns='Day', values='Revenue', aggfunc='sum', fill_value=0, observed=True)
+    matrix = matrix.reindex(columns=range(1, 32), fill_value=0)
+    groups = matrix.index.to_frame(index=False)
+
+    # "As of" per scope: last reported day; month length from that date
+    last = daily.groupby(scope, observed=True)['Date'].max() if scope else None
+    if scope:
+        as_of = groups[scope].merge(last.reset_index(), on=scope, how='left')['Date']
+    else:
+        as_of = pd.Series(daily['Date'].max(), index=groups.index)
+
+    elapsed = as_of.dt.day.to_numpy(dtype=float)
+    days_in_month = as_of.dt.days_in_month.to_numpy(dtype=float)
+    left = days_in_month - elapsed
+
+    values = matrix.to_numpy(dtype=float)
+    mask = np.arange(1, 32)[None, :] <= elapsed[:, None]
+    observed = (values * mask).sum(axis=1)
+    mean = observed / elapsed
+    var = (((values - mean[:, None]) ** 2) * mask).sum(axis=1) / np.maximum(elapsed - 1, 1)
+    std = np.sqrt(var * (left + left ** 2 / elapsed))
+
+    point = observed + mean * left
+    z = Z[level]
+    return groups.assign(
+        Observed=observed,
+        Elapsed=elapsed.astype(int),
+        DaysLeft=left.astype(int),
+        Forecast=point,
+        Low=np.maximum(point - z * std, observed),
+        High=point + z * std,
+        Std=std,
+    )
+
+
+def probability_above(threshold, forecast, std):
+    """P(month revenue >= threshold) under the normal projection; vectorized."""
+    forecast = np.asarray(forecast, dtype=float)
+    std = np.asarray(std, dtype=float)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        p = 1 - normal_cdf((threshold - forecast) / std)
+    return np.where(std > 0, p, (forecast >= threshold).astype(float))
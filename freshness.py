@@ -0,0 +1,52 @@
+import time
+
+import streamlit as st
+
+import changes
+import refresher
+
+# --- Data age indicator ---
+# Loaders serve the last good snapshot even when Google Sheets is slow or down;
+# this tells the user how old that snapshot is, and what the refreshes changed.
+
+
+def format_age(seconds):
+    minutes = int(seconds // 60)
+    if minutes < 1:
+        return "только что"
+    if minutes < 60:
+        return f"{minutes} мин назад"
+    hours = minutes // 60
+    if hours < 48:
+        return f"{hours} ч назад"
+    return f"{hours // 24} дн назад"
+
+
+def show_data_age(name, container=None):
+    """Caption with the snapshot age of workbook `name`; warning if the last refresh failed."""
+    info = refresher.status(name)
+    if not info or info["age"] is None:
+        return
+
+    container = container or st.sidebar
+    text = f"🕒 Данные обновлены {format_age(info['age'])}"
+    if info["refreshing"]:
+        text += " · обновляются…"
+
+    if info["last_error"]:
+        container.warning(f"{text}. Источник недоступен ({info['last_error']}), показана последняя сохранённая версия.")
+    else:
+        container.caption(text)
+
+
+def show_changes(log, container=None):
+    """Changes of the last refresh that changed anything, then the rest of the log."""
+    container = container or st
+    if log is None or log.empty:
+        container.info("С прошлых обновлений данные не менялись.")
+        return
+    last = changes.latest(log)
+    container.caption(f"Последнее изменение найдено {format_age(time.time() - last['Обнаружено'].iloc[0])}: "
+                      f"{len(last)} строк. Журнал за {changes.LOG_SECONDS // 3600} ч — {len(log)} строк.")
+    view = log.assign(Обнаружено=log['Обнаружено'].map(lambda t: time.strftime('%d.%m %H:%M', time.localtime(t))))
+    container.dataframe(view[changes.COLUMNS], hide_index=True, use_container_width=True)
@@ -0,0 +1,357 @@
+import argparse
+import asyncio
+import contextlib
+import datetime as dt
+import io
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+import pandas as pd
+from streamlit.proto.BackMsg_pb2 import BackMsg
+from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+from websockets.asyncio.client import connect
+
+from workbooks import MONTH_NAMES
+
+# --- Concurrent sessions load test ---
+# Drives simulated browser sessions against a real `streamlit run` server of
+# each app and reports rerun latency p50/p95/p99, throughput and the server
+# process's memory as the number of concurrent sessions grows.
+#
+# streamlit.testing's AppTest can't do this: it swaps a process-global runtime
+# on every run, so parallel AppTests in one process break each other. The
+# sessions here talk to the server over its websocket instead, like browsers.
+#
+# Nothing touches Google Sheets: a local stand-in serves fixture workbooks
+# generated at startup, and the apps find it through AURORA_SHEETS_BASE and a
+# temporary AURORA_BRANCHES config. Each (app, sessions) step starts a fresh
+# server with its own data plane, so one step's caches never warm the next.
+#
+#   python loadtest.py                                   (app.py and sales_report.py, 1-16 sessions)
+#   python loadtest.py --apps sales_report.py --sessions 1 8 32 --reruns 20 --days 90
+#
+# RSS MB is the server's peak during the step; MB/sess its growth over the warmed-up
+# server per session. Exit code 1 if any run raised.
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+APPS = ["app.py", "sales_report.py"]
+SESSIONS = [1, 2, 4, 8, 16]
+RERUNS = 10    # timed reruns per session, after its first run
+TIMEOUT = 120  # seconds per run
+STARTUP_TIMEOUT = 60
+RSS_EVERY = 0.1  # seconds between memory samples of the server
+
+MANAGERS = ["Аня", "Боря", "Вика", "Гоша", "Даша", "Ерлан"]
+
+# Temporary branches.json: every workbook points at a fixture served by the stand-in (fixture_workbooks)
+FIXTURE_BRANCHES = {
+    "almaty": {"name": "🌸 Алматы", "sales": {"sheet_id": "loadtest-sales-almaty"}},
+    "astana": {
+        "name": "🏙 Астана",
+        "pnl": {"sheet_id": "loadtest-pnl"},
+        "fixed_costs": {"sheet_id": "loadtest-pnl", "gid": "1"},
+        "catalog": {"sheet_id": "loadtest-pnl", "gid": "2"},
+        "sales": {"sheet_id": "loadtest-sales-astana"},
+    },
+}
+
+
+# --- Fixture workbooks ---
+
+def _xlsx(sheets):
+    buffer = io.BytesIO()
+    with pd.ExcelWriter(buffer, engine="openpyxl") as writer:
+        for name, df in sheets.items():
+            df.to_excel(writer, sheet_name=name, index=False)
+    return buffer.getvalue()
+
+
+def _days(days):
+    start = dt.date.today() - dt.timedelta(days=days - 1)
+    return [start + dt.timedelta(days=i) for i in range(days)]
+
+
+def pnl_workbook(days, seed=0):
+    rng = np.random.default_rng(seed)
+    dates = _days(days)
+    expenses = pd.DataFrame([
+        {"Дата": d.strftime("%d.%m.%Y"), "Категория": category, "Сумма": int(rng.integers(1000, 90000))}
+        for d in dates for category in ("Цветы", "Упаковка", "Зарплата", "Аренда") if rng.random() < 0.6
+    ])
+    target = pd.DataFrame({"Дата": [d.strftime("%d.%m.%Y") for d in dates],
+                           "Сумма в тенге": rng.integers(3000, 8000, len(dates))})
+    months = list(dict.fromkeys(d.month for d in dates))
+    sales = pd.DataFrame({"Месяц": [MONTH_NAMES[m] for m in months],
+                          "Сумма продаж": rng.integers(4, 9, len(months)) * 1e6})
+    return _xlsx({"Лист1": expenses, "Таргет": target, "Продажи по месяцам": sales})
+
+
+def fixed_costs_workbook():
+    return _xlsx({"Sheet1": pd.DataFrame({
+        "Наименование расхода": ["Аренда", "Зарплаты", "Коммунальные", "Процент"],
+        "Январь": [1, 2, 3, 4], "Февраль": [1, 2, 3, 4], "Март": [1, 2, 3, 4],
+        "Итого в месяц": [500000, 1200000, 80000, 0.5],
+    })})
+
+
+def catalog_workbook(items=200, seed=0):
+    rng = np.random.default_rng(seed)
+    cost = rng.integers(100, 5000, items)
+    return _xlsx({"Sheet1": pd.DataFrame({
+        "Название": [f"Товар {i}" for i in range(items)],
+        "Категория": rng.choice(["Цветы", "Упаковка", "Игрушки"], items),
+        "Себестоимость": cost,
+        "Цена_Базовая": (cost * rng.uniform(1.8, 3.0, items)).round(-1),
+    })})
+
+
+def sales_workbook(days, seed=1):
+    """One sheet per month ('Февраль 2026'), a row per manager-day."""
+    rng = np.random.default_rng(seed)
+    rows = []
+    for d in _days(days):
+        for manager in MANAGERS:
+            leads = int(rng.integers(10, 40))
+            orders = int(rng.integers(1, leads // 2))
+            rows.append({"Дата": dt.datetime(d.year, d.month, d.day), "Имя менеджера": manager,
+                         "Кол-во лидов": leads, "Оформлены": orders, "Итого": orders * int(rng.integers(12000, 20000))})
+    frame = pd.DataFrame(rows)
+    month = frame["Дата"].dt.to_period("M")
+    return _xlsx({f"{MONTH_NAMES[p.month]} {p.year}": part for p, part in frame.groupby(month)})
+
+
+def fixture_workbooks(days):
+    return {
+        ("loadtest-pnl", None): pnl_workbook(days),
+        ("loadtest-pnl", "1"): fixed_costs_workbook(),
+        ("loadtest-pnl", "2"): catalog_workbook(),
+        ("loadtest-sales-almaty", None): sales_workbook(days, seed=1),
+        ("loadtest-sales-astana", None): sales_workbook(days, seed=2),
+    }
+
+
+# --- Google Sheets stand-in ---
+
+def serve_fixtures(books):
+    """Serve {(sheet id, gid): xlsx bytes} at /<sheet id>/export?gid=...; returns the base url."""
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            url = urlparse(self.path)
+            sheet_id = url.path.strip("/").split("/")[0]
+            body = books.get((sheet_id, parse_qs(url.query).get("gid", [None])[0]))
+            if body is None:
+                self.send_error(404)
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, name="sheets-stand-in", daemon=True).start()
+    return f"http://127.0.0.1:{server.server_address[1]}"
+
+
+# --- App server and simulated browser sessions ---
+# Each session is a websocket client speaking the browser's protocol: it asks
+# for a script run (BackMsg.rerun_script, what every widget interaction sends)
+# and times it until the server reports script_finished.
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _rss_mb(pid):
+    """Resident set size of process `pid` in MiB (Linux /proc; None elsewhere)."""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 2**10
+    except OSError:
+        pass
+    return None
+
+
+@contextlib.contextmanager
+def app_server(app, env, log_path):
+    """`streamlit run app` on a free port; yields (port, pid) once it answers its health check."""
+    port = _free_port()
+    with open(log_path, "wb") as log:
+        server = subprocess.Popen(
+            [sys.executable, "-m", "streamlit", "run", os.path.join(ROOT, app), "--server.headless", "true",
+             "--server.address", "127.0.0.1", "--server.port", str(port), "--server.enableXsrfProtection", "false",
+             "--server.fileWatcherType", "none", "--browser.gatherUsageStats", "false"],
+            cwd=ROOT, env=env, stdout=log, stderr=subprocess.STDOUT
+        )
+    try:
+        deadline = time.time() + STARTUP_TIMEOUT
+        while True:
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/_stcore/health", timeout=1):
+                    break
+            except OSError:
+                if server.poll() is not None or time.time() > deadline:
+                    with open(log_path, encoding="utf-8", errors="replace") as f:
+                        raise RuntimeError(f"{app}: server did not start\n{f.read()[-2000:]}")
+                time.sleep(0.2)
+        yield port, server.pid
+    finally:
+        server.terminate()
+        server.wait(10)
+
+
+async def _script_run(ws):
+    """One script run; returns the exceptions it showed."""
+    request = BackMsg()
+    request.rerun_script.query_string = ""
+    await ws.send(request.SerializeToString())
+    errors = []
+    while True:
+        msg = ForwardMsg()
+        msg.ParseFromString(await ws.recv())
+        kind = msg.WhichOneof("type")
+        if kind == "delta" and msg.delta.WhichOneof("type") == "new_element" \
+                and msg.delta.new_element.WhichOneof("type") == "exception":
+            errors.append(msg.delta.new_element.exception.message)
+        elif kind == "script_finished":
+            if msg.script_finished == ForwardMsg.FINISHED_WITH_COMPILE_ERROR:
+                errors.append("compile error")
+            return errors
+
+
+async def _session(ws, reruns, result):
+    for i in range(reruns + 1):
+        started = time.perf_counter()
+        try:
+            errors = await asyncio.wait_for(_script_run(ws), TIMEOUT)
+        except asyncio.TimeoutError:
+            result["errors"].append(f"no script_finished in {TIMEOUT} s")
+            return  # the stream is out of step now
+        (result["first"] if i == 0 else result["latencies"]).append(time.perf_counter() - started)
+        result["errors"].extend(errors)
+
+
+async def _sample_rss(pid, samples):
+    while True:
+        samples.append(_rss_mb(pid))
+        await asyncio.sleep(RSS_EVERY)
+
+
+async def drive(port, pid, sessions, reruns):
+    """Connect `sessions` clients, then run their first run + `reruns` reruns all at once."""
+    stream = f"ws://127.0.0.1:{port}/_stcore/stream"
+    result = {"first": [], "latencies": [], "errors": []}
+
+    # Warm-up session: downloads and publishes the fixtures, so no timed run waits for the stand-in
+    async with connect(stream, subprotocols=["streamlit"], max_size=None) as ws:
+        result["warmup_errors"] = await asyncio.wait_for(_script_run(ws), TIMEOUT)
+    result["baseline_mb"] = _rss_mb(pid)
+
+    async with contextlib.AsyncExitStack() as stack:
+        clients = [await stack.enter_async_context(connect(stream, subprotocols=["streamlit"], max_size=None))
+                   for _ in range(sessions)]
+        samples = []
+        sampler = asyncio.create_task(_sample_rss(pid, samples))
+        started = time.perf_counter()
+        await asyncio.gather(*(_session(ws, reruns, result) for ws in clients))
+        result["wall"] = time.perf_counter() - started
+        sampler.cancel()
+    samples = [m for m in samples if m is not None]
+    result["rss_mb"] = max(samples) if samples else None
+    return result
+
+
+# --- Report ---
+
+def _percentile(values, q):
+    return float(np.percentile(values, q)) * 1000 if values else float("nan")
+
+
+def summarize(app, sessions, result):
+    errors = result["warmup_errors"] + result["errors"]
+    runs = len(result["first"]) + len(result["latencies"])
+    memory = result["rss_mb"] is not None and result["baseline_mb"] is not None
+    return {
+        "app": app, "sessions": sessions, "reruns": len(result["latencies"]),
+        "first_ms": statistics.median(result["first"]) * 1000 if result["first"] else float("nan"),
+        "p50_ms": _percentile(result["latencies"], 50),
+        "p95_ms": _percentile(result["latencies"], 95),
+        "p99_ms": _percentile(result["latencies"], 99),
+        "runs_per_s": runs / result["wall"] if result["wall"] else 0.0,
+        "rss_mb": result["rss_mb"] if memory else float("nan"),
+        "mb_per_session": (result["rss_mb"] - result["baseline_mb"]) / sessions if memory else float("nan"),
+        "errors": len(errors),
+        "first_error": errors[0] if errors else None,
+    }
+
+
+def print_table(rows):
+    print(f"{'app':<16} {'sessions':>8} {'reruns':>7} {'first':>8} {'p50':>8} {'p95':>8} {'p99':>8} "
+          f"{'runs/s':>7} {'RSS MB':>7} {'MB/sess':>7} {'errors':>6}")
+    for r in rows:
+        print(f"{r['app']:<16} {r['sessions']:>8} {r['reruns']:>7} {r['first_ms']:>6.0f}ms {r['p50_ms']:>6.0f}ms "
+              f"{r['p95_ms']:>6.0f}ms {r['p99_ms']:>6.0f}ms {r['runs_per_s']:>7.1f} {r['rss_mb']:>7.0f} "
+              f"{r['mb_per_session']:>7.1f} {r['errors']:>6}")
+        if r["first_error"]:
+            print(f"{'':<16} first error: {r['first_error']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rerun latency, throughput and memory of concurrent app sessions.")
+    parser.add_argument("--apps", nargs="+", default=APPS)
+    parser.add_argument("--sessions", nargs="+", type=int, default=SESSIONS, help="concurrency levels")
+    parser.add_argument("--reruns", type=int, default=RERUNS, help="timed reruns per session")
+    parser.add_argument("--days", type=int, default=60, help="days of sales and expenses in the fixtures")
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    books = fixture_workbooks(args.days)
+    base = serve_fixtures(books)
+
+    rows = []
+    with tempfile.TemporaryDirectory(prefix="aurora_loadtest_") as tmp:
+        config = os.path.join(tmp, "branches.json")
+        with open(config, "w", encoding="utf-8") as f:
+            json.dump({"branches": FIXTURE_BRANCHES}, f, ensure_ascii=False)
+        print(f"Fixtures: {len(books)} workbooks, {sum(map(len, books.values())) / 2**10:.0f} KiB, served at {base}")
+
+        for app in args.apps:
+            for step, sessions in enumerate(args.sessions):
+                run_dir = os.path.join(tmp, f"{app}-{step}")
+                os.makedirs(run_dir)
+                env = {**os.environ, "AURORA_SHEETS_BASE": base, "AURORA_BRANCHES": config,
+                       "AURORA_DATA_DIR": os.path.join(run_dir, "data"),
+                       "AURORA_SALES_INBOX": os.path.join(run_dir, "inbox"),
+                       "AURORA_SALES_PORT": str(_free_port())}
+                with app_server(app, env, os.path.join(run_dir, "server.log")) as (port, pid):
+                    rows.append(summarize(app, sessions, asyncio.run(drive(port, pid, sessions, args.reruns))))
+                print(f"  {app} x{sessions}: p95 {rows[-1]['p95_ms']:.0f} ms, {rows[-1]['runs_per_s']:.1f} runs/s", flush=True)
+        print()
+        print_table(rows)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(rows, f, ensure_ascii=False, indent=2)
+    return 1 if any(r["errors"] for r in rows) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
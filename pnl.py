@@ -0,0 +1,40 @@
+import pandas as pd
+
+# --- P&L by month (app.py and the export API) ---
+# Expenses are 'Лист1' plus 'Таргет' (ad spend, its own category); revenue is
+# the 'Продажи по месяцам' sheet. Months keep the order of the sales sheet.
+
+EXPENSE_COLUMNS = ['Дата', 'Категория', 'Сумма']
+
+
+def combine_expenses(expenses, target):
+    """'Лист1' and 'Таргет' rows as one Дата / Категория / Сумма (+ Месяц) frame."""
+    cols = EXPENSE_COLUMNS + ['Месяц']
+    parts = [df[cols] for df in (expenses, target) if not df.empty and set(cols) <= set(df.columns)]
+    if not parts:
+        return pd.DataFrame(columns=cols)
+    # Категория is categorical per sheet; concat of different categories would fall back to object anyway
+    return pd.concat([p.astype({'Категория': str}) for p in parts], ignore_index=True)
+
+
+def by_month(expenses, target, sales):
+    """Месяц, Выручка, Расходы, Таргет, Чистая прибыль for every month of the sales sheet."""
+    if sales.empty or 'Месяц' not in sales.columns:
+        return pd.DataFrame(columns=['Месяц', 'Выручка', 'Расходы', 'Таргет', 'Чистая прибыль'])
+    months = [m for m in sales['Месяц'].astype(str).unique() if m and m.lower() != 'nan']
+    combined = combine_expenses(expenses, target)
+    month = combined['Месяц'].astype(str)
+    result = pd.DataFrame({
+        'Выручка': sales.groupby(sales['Месяц'].astype(str), observed=True)['Сумма продаж'].sum(),
+        'Расходы': combined.groupby(month)['Сумма'].sum(),
+        'Таргет': combined[combined['Категория'] == 'Таргет'].groupby(month)['Сумма'].sum(),
+    }).reindex(months).fillna(0.0)
+    result['Чистая прибыль'] = result['Выручка'] - result['Расходы']
+    return result.rename_axis('Месяц').reset_index()
+
+
+def by_category(expenses, target, month):
+    """Expenses of one month per category, largest first."""
+    combined = combine_expenses(expenses, target)
+    combined = combined[combined['Месяц'].astype(str) == month]
+    return combined.groupby('Категория')['Сумма'].sum().sort_values(ascending=False).reset_index()
@@ -0,0 +1,92 @@
+import numpy as np
+import pandas as pd
+
+# --- Combo pricing model ---
+# For a sale price P with material cost M and total commission rate c
+# (Kaspi + florist + manager + tax, as a fraction of P):
+#   commission   = P * c
+#   net profit   = P * (1 - c) - M
+#   gross markup = P / M
+#   net markup   = P / (M + P * c)
+# Each target below is solved in closed form, so any number of carts is
+# priced in one vectorized call. Unreachable targets come back as NaN.
+
+
+def commission_rate(*pcts):
+    """Sum of commission percentages -> fraction of the sale price."""
+    return sum(pcts) / 100
+
+
+def cart_metrics(price, material_cost, rate):
+    """Financials of selling at `price`; scalars or arrays."""
+    price = np.asarray(price, dtype=float)
+    material_cost = np.asarray(material_cost, dtype=float)
+    commission = price * rate
+    expenses = material_cost + commission
+    with np.errstate(divide="ignore", invalid="ignore"):
+        gross_markup = np.where(material_cost > 0, price / material_cost, 0.0)
+        net_markup = np.where(expenses > 0, price / expenses, 0.0)
+    return {
+        "commission": commission,
+        "expenses": expenses,
+        "net_profit": price - expenses,
+        "gross_markup": gross_markup,
+        "net_markup": net_markup,
+    }
+
+
+def price_for_profit(material_cost, target_profit, rate):
+    """Minimum price with net profit >= target_profit: P = (T + M) / (1 - c)."""
+    material_cost = np.asarray(material_cost, dtype=float)
+    if rate >= 1:
+        return np.full(material_cost.shape, np.nan)
+    return (np.asarray(target_profit, dtype=float) + material_cost) / (1 - rate)
+
+
+def price_for_net_markup(material_cost, target_markup, rate):
+    """Minimum price with net markup >= k: P = k * M / (1 - k * c); NaN when k * c >= 1."""
+    material_cost = np.asarray(material_cost, dtype=float)
+    k = np.asarray(target_markup, dtype=float)
+    denom = 1 - k * rate
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(denom > 0, k * material_cost / denom, np.nan)
+
+
+def round_price(price, step=100):
+    """Round up to the price step used in the shop (NaN stays NaN)."""
+    return np.ceil(np.asarray(price, dtype=float) / step) * step
+
+
+def price_grid(material_cost, rate, markups=None):
+    """Net profit and net markup for a range of gross markups (price = markup * cost)."""
+    if markups is None:
+        markups = np.round(np.arange(1.5, 4.0 + 1e-9, 0.1), 1)
+    markups = np.asarray(markups, dtype=float)
+    prices = markups * material_cost
+    metrics = cart_metrics(prices, material_cost, rate)
+    return pd.DataFrame({
+        "Накрутка": markups,
+        "Цена": prices,
+        "Комиссии": metrics["commission"],
+        "Чистая прибыль": metrics["net_profit"],
+        "Накрутка (Net)": metrics["net_markup"],
+    })
+
+
+def solve_batch(carts, rate, target, mode="profit", step=100):
+    """
+    Price many carts at once.
+    carts: DataFrame with 'Себестоимость' (material cost per cart).
+    mode: 'profit' (target = net profit ₸) or 'net_markup' (target = x).
+    """
+    cost = carts["Себестоимость"].to_numpy(dtype=float)
+    exact = price_for_profit(cost, target, rate) if mode == "profit" else price_for_net_markup(cost, target, rate)
+    price = round_price(exact, step)
+    metrics = cart_metrics(price, cost, rate)
+    return carts.assign(**{
+        "Мин. цена": exact,
+        "Цена": price,
+        "Чистая прибыль": metrics["net_profit"],
+        "Накрутка (Gross)": metrics["gross_markup"],
+        "Накрутка (Net)": metrics["net_markup"],
+    })
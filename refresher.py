@@ -0,0 +1,167 @@
+import threading
+import time
+import traceback
+
+import data_plane
+
+# --- Background refresh (stale-while-revalidate) ---
+# One daemon thread per server process re-downloads registered workbooks on
+# their cadence and publishes new versions to the data plane; readers pick
+# the new version up atomically on their next rerun. Readers always get the
+# last good snapshot immediately, even when it is stale or Google Sheets is
+# down; only a cold start with no snapshot at all waits, and never longer
+# than DEADLINE.
+#
+# Across processes a per-workbook file lock makes sure only one scheduler
+# downloads a given workbook; the others see the fresh version and skip it.
+
+TICK = 5        # seconds between schedule checks
+DEADLINE = 45   # max seconds anyone waits for one download + parse
+
+_lock = threading.Lock()
+_jobs = {}  # name -> {"build", "interval", "next_run", "last_error", "worker"}
+_thread = None
+
+
+def register(name, build, interval):
+    """
+    Schedule workbook `name` (build() -> {sheet: DataFrame}) every `interval` seconds.
+    Safe to call on every rerun; also starts the scheduler thread if needed.
+    """
+    with _lock:
+        job = _jobs.get(name)
+        if job is None:
+            manifest = data_plane.current(name)
+            next_run = manifest["created"] + interval if manifest else time.time()
+            job = _jobs[name] = {"build": build, "interval": interval, "next_run": next_run,
+                                 "last_error": None, "worker": None, "started": None}
+        else:
+            job["build"], job["interval"] = build, interval
+    start()
+    return job
+
+
+def start():
+    global _thread
+    with _lock:
+        if _thread is None or not _thread.is_alive():
+            _thread = threading.Thread(target=_loop, name="workbook-refresher", daemon=True)
+            _thread.start()
+
+
+def _loop():
+    # Due workbooks refresh in parallel and the loop never waits on them, so a
+    # stalled download delays only its own workbook
+    while True:
+        now = time.time()
+        with _lock:
+            due = [(name, job) for name, job in _jobs.items() if job["next_run"] <= now]
+        for name, job in due:
+            worker = _start(name, job)
+            if worker.is_alive() and now - job["started"] > DEADLINE:
+                job["last_error"] = f"Нет ответа за {DEADLINE:.0f} с"
+                job["next_run"] = now + job["interval"]
+        time.sleep(TICK)
+
+
+def _refresh(name, job, force=False):
+    """Rebuild and publish one workbook unless another process just did."""
+    try:
+        # Cold start: wait for a process that is already downloading instead of skipping
+        cold = data_plane.current(name) is None
+        with data_plane.lock(name, blocking=cold) as acquired:
+            manifest = data_plane.current(name)
+            fresh_until = manifest["created"] + job["interval"] if manifest else 0
+            if (acquired or force) and (force or fresh_until <= time.time()):
+                data_plane.publish(name, job["build"]())
+                job["last_error"] = None
+                fresh_until = time.time() + job["interval"]
+            elif fresh_until > time.time():
+                job["last_error"] = None  # another process published a fresh version
+        job["next_run"] = max(fresh_until, time.time() + TICK)
+    except Exception as e:
+        # Keep serving the previous version; retry on the next interval
+        job["last_error"] = f"{type(e).__name__}: {e}"
+        job["next_run"] = time.time() + job["interval"]
+        traceback.print_exc()
+
+
+def _start(name, job, force=False):
+    """Worker thread refreshing `name`: the one in flight, or a new one."""
+    with _lock:
+        worker = job["worker"]
+        if worker is None or not worker.is_alive():
+            worker = job["worker"] = threading.Thread(target=_refresh, args=(name, job, force), daemon=True)
+            job["started"] = time.time()
+            worker.start()
+    return worker
+
+
+def _run(name, job, force=False, deadline=None):
+    """
+    Refresh in a worker thread and wait at most `deadline` seconds.
+    A stalled download keeps running in its thread but blocks nobody; a
+    refresh already in flight is joined instead of started twice.
+    """
+    worker = _start(name, job, force)
+    deadline = deadline or DEADLINE
+    worker.join(deadline)
+    if worker.is_alive():
+        job["last_error"] = f"Нет ответа за {deadline:.0f} с"
+        job["next_run"] = time.time() + job["interval"]
+        return False
+    return job["last_error"] is None
+
+
+def serve(name, build, interval):
+    """
+    Frames of workbook `name` for a user rerun.
+    Returns the last good snapshot at once (stale or not); a snapshot older
+    than `interval` is revalidated in the background. With no snapshot at
+    all, waits up to DEADLINE for the first download and raises on failure.
+    """
+    job = register(name, build, interval)
+
+    frames = data_plane.attach(name)
+    if frames is not None:
+        if data_age(name) > interval and not (job["worker"] and job["worker"].is_alive()):
+            job["next_run"] = 0  # scheduler picks it up on its next tick
+        return frames
+
+    _run(name, job)
+    frames = data_plane.attach(name)
+    if frames is None:
+        raise IOError(job["last_error"] or "Нет данных")
+    return frames
+
+
+def refresh_now(name, deadline=None):
+    """
+    Rebuild only workbook `name` now (manual refresh button).
+    Raises if the download/parse fails or exceeds the deadline; the previous
+    version stays current either way.
+    """
+    with _lock:
+        job = _jobs.get(name)
+    if job is None:
+        raise KeyError(f"Workbook not registered: {name}")
+    if not _run(name, job, force=True, deadline=deadline):
+        raise IOError(job["last_error"])
+
+
+def data_age(name):
+    """Seconds since the current snapshot of `name` was published (None if never)."""
+    manifest = data_plane.current(name)
+    return time.time() - manifest["created"] if manifest else None
+
+
+def status(name):
+    """For UI: {"age", "next_run", "last_error", "refreshing"} or None if not registered."""
+    with _lock:
+        job = _jobs.get(name)
+        if job is None:
+            return None
+        refreshing = bool(job["worker"] and job["worker"].is_alive())
+        info = {"next_run": job["next_run"], "last_error": job["last_error"], "refreshing": refreshing}
+    info["age"] = data_age(name)
+    return info
@@ -1,17 +1,16 @@
 import streamlit as st
 import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
-import requests
-from io import BytesIO
-import ssl
-import datetime
-
-# --- НАСТРОЙКИ ГОРОДОВ ---
-CITIES = {
-    "🌸 Алматы": "1GmPi4yQ3bcSAOF_9XAbCdOw-PW3ptPv4Z61hHNrbIvA",
-    "🏙 Астана": "1ZpSAtOcA8X1PWfrfbIrvZKwlC2_JyRN5nptzOunOm0A"
-}
+
+import anomalies
+import branches
+import data_plane
+import forecast
+import sales_stream
+import workbooks
+from freshness import show_changes, show_data_age
+
+# --- НАСТРОЙКИ ГОРОДОВ (branches.json) ---
+CITIES = branches.with_workbook("sales")  # название -> ключ филиала
 
 # --- PAGE CONFIG ---
 st.set_page_config(page_title="Аналитика Продаж", layout="wide", page_icon="🏆")
@@ -30,43 +29,31 @@ st.markdown("""
     """, unsafe_allow_html=True)
 
 # --- ЗАГРУЗЧИК ---
-@st.cache_resource(ttl=300)
-def load_excel_data(sheet_id):
-    url = f"https://docs.google.com/spreadsheets/d/{sheet_id}/export?format=xlsx"
-    
-    # Helper to load
-    def read_bytes(b):
-        try: return pd.ExcelFile(BytesIO(b), engine='openpyxl')
-        except: return pd.ExcelFile(BytesIO(b))
-
-    # 1. Try Requests
+def load_excel_data(branch):
+    """Все листы месяцев, уже очищенные; общая копия для всех сессий и процессов."""
+    # Фоновое обновление всех городов раз в 5 минут: переключение города не ждёт загрузки
+    for key in CITIES.values():
+        if key != branch:
+            branches.register(key, "sales")
     try:
-        try:
-            _create_unverified_https_context = ssl._create_unverified_context
-            ssl._create_default_https_context = _create_unverified_https_context
-        except: pass
-
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
-        }
-        response = requests.get(url, headers=headers, verify=False, timeout=30)
-        if response.status_code == 200:
-            return read_bytes(response.content)
+        return branches.serve(branch, "sales")
     except Exception as e:
-        print(f"Requests error: {e}")
+        st.error(f"Не удалось скачать файл (попробуйте обновить страницу): {e}")
+        return None
 
-    # 2. Fallback to Curl (System)
-    try:
-        import subprocess
-        cmd = ["curl", "-L", "-k", "-s", url]
-        result = subprocess.run(cmd, capture_output=True)
-        if result.returncode == 0 and len(result.stdout) > 0:
-            return read_bytes(result.stdout)
-    except Exception as e:
-        st.error(f"Curl error: {e}")
+@st.cache_data(show_spinner=False, max_entries=16)
+def scan_anomalies(versions):
+    """Аномальные смены всех городов и месяцев одним проходом; пересчет при новой версии любого города."""
+    # Только уже загруженные снимки: чужой город не заставляет ждать скачивания
+    city_sheets = {name: data_plane.attach(branches.url(key, "sales")) for name, key in CITIES.items()}
+    return anomalies.manager_anomalies(workbooks.stack_sales({k: v for k, v in city_sheets.items() if v}))
 
-    st.error("Не удалось скачать файл (попробуйте обновить страницу).")
-    return None
+# --- ПОТОК ПРОДАЖ ЗА ДЕНЬ ---
+# Строки менеджеров между обновлениями таблицы: папка-инбокс или POST localhost:8601/sales
+for city_name, key in CITIES.items():
+    sales_stream.register_city(key, city_name, branches.BRANCHES[key]["sales"]["sheet_id"])
+sales_stream.serve_http()
+sales_stream.poll()
 
 # --- SIDEBAR (ВЫБОР) ---
 with st.sidebar:
@@ -77,15 +64,11 @@ with st.sidebar:
     st.divider()
     
     # Загрузка файла
-    xls = load_excel_data(current_id)
+    sheets = load_excel_data(current_id)
+    show_data_age(branches.url(current_id, "sales"), st)
     
-    if xls:
-        # Фильтр листов: Только 2026 и без Оффлайна
-        all_sheets = [s for s in xls.sheet_names if "2026" in s and "оффлайн" not in s.lower()]
-        
-        # Если вдруг нет 2026, показываем все, кроме системных
-        if not all_sheets:
-            all_sheets = [s for s in xls.sheet_names if "sheet" not in s.lower()]
+    if sheets:
+        all_sheets = list(workbooks.month_sheets(sheets))
 
         st.header("📅 Период")
         # Выбираем последний месяц по умолчанию
@@ -95,43 +78,43 @@ with st.sidebar:
         st.error("Ошибка загрузки файла Google Sheets.")
         st.stop()
 
+    dropped = sheets.get(workbooks.DROPPED_SHEET)
+    if dropped is not None and not dropped.empty:
+        with st.expander(f"🧹 Пропущено строк: {len(dropped)}"):
+            st.dataframe(dropped, hide_index=True, use_container_width=True)
+
+    live = st.toggle("⚡ Live: продажи за день", value=True, help="Новые строки из инбокса подхватываются каждые 5 секунд")
+
+st.session_state["stream_revision"] = sales_stream.revision()  # строки потока, которые покажет этот прогон
+
+if live:
+    @st.fragment(run_every=5)
+    def watch_stream():
+        # poll() отдает новые строки первой спросившей сессии; остальные видят их по ревизии
+        sales_stream.poll()
+        if sales_stream.revision() != st.session_state.get("stream_revision"):
+            st.rerun()
+    watch_stream()
+
 # --- ОСНОВНАЯ ЛОГИКА ---
 if selected_sheet:
     try:
-        df = pd.read_excel(xls, sheet_name=selected_sheet)
-        
-        # Поиск колонок
-        col_map = {}
-        for col in df.columns:
-            c = str(col).lower()
-            if "имя менеджера" in c: col_map[col] = "Manager"
-            elif "лидов" in c: col_map[col] = "Leads"
-            elif "оформлены" in c: col_map[col] = "Orders"
-            elif "итого" in c: col_map[col] = "Revenue"
-            elif "дата" in c: col_map[col] = "Date"
-        
-        df = df.rename(columns=col_map)
+        # Лист уже очищен при загрузке; пустой = неверные заголовки
+        df = sheets[selected_sheet]
         
         # Валидация
-        req = ['Manager', 'Leads', 'Orders', 'Revenue', 'Date']
-        if not all(k in df.columns for k in req):
+        if df.empty:
             st.error(f"Неверный формат таблицы '{selected_sheet}'. Проверьте заголовки.")
             st.stop()
 
-        # Чистка
-        df = df.dropna(subset=['Manager', 'Date'])
-        df['Manager'] = df['Manager'].astype(str) # Fix mixed definition
-        df['Date'] = pd.to_datetime(df['Date'], errors='coerce')
-        df = df.dropna(subset=['Date'])
-        for k in ['Leads', 'Orders', 'Revenue']:
-            df[k] = pd.to_numeric(df[k], errors='coerce').fillna(0)
-
-        # Расчеты
-        total_rev = df['Revenue'].sum()
-        total_leads = df['Leads'].sum()
-        total_orders = df['Orders'].sum()
-        avg_conv = (total_orders / total_leads * 100) if total_leads else 0
-        avg_check = (total_rev / total_orders) if total_orders else 0
+        # Расчеты: лист + строки за день, агрегаты обновляются инкрементально
+        stream = sales_stream.aggregates(current_id, selected_sheet, df)
+        totals = stream.totals()
+        total_rev = totals['Revenue']
+        total_leads = totals['Leads']
+        total_orders = totals['Orders']
+        avg_conv = totals['Conversion']
+        avg_check = totals['AvgCheck']
 
         # --- ГЛАВНЫЙ ЭКРАН ---
         st.title(f"📊 Отчет: {selected_city_name} | {selected_sheet}")
@@ -145,18 +128,16 @@ if selected_sheet:
 
         st.divider()
 
+        # Графики: plotly подгружается только здесь, после первой отрисовки метрик
+        import plotly.express as px
+        import plotly.graph_objects as go
+
         # ВКЛАДКИ
-        tab1, tab2, tab3 = st.tabs(["🏆 Рейтинг Менеджеров", "📅 Динамика", "👤 Менеджеры"])
+        tab1, tab2, tab3, tab4, tab5, tab6 = st.tabs(["🏆 Рейтинг Менеджеров", "📅 Динамика", "👤 Менеджеры", "🔮 Прогноз", "🚨 Аномалии", "🔄 Изменения"])
 
         with tab1:
             # Подготовка данных
-            mgr_stats = df.groupby('Manager').agg({
-                'Revenue': 'sum', 'Orders': 'sum', 'Leads': 'sum', 'Date': 'nunique'
-            }).reset_index()
-            
-            mgr_stats['Conversion'] = (mgr_stats['Orders'] / mgr_stats['Leads'] * 100).fillna(0)
-            mgr_stats['AvgShift'] = (mgr_stats['Revenue'] / mgr_stats['Date']).fillna(0)
-            mgr_stats = mgr_stats.sort_values('AvgShift', ascending=False)
+            mgr_stats = stream.manager_stats()
 
             # ГРАФИК (С адаптацией для мобильных)
             fig = go.Figure()
@@ -188,7 +169,7 @@ if selected_sheet:
 
         with tab2:
             st.markdown("### 📈 Динамика выручки по дням")
-            daily = df.groupby('Date')['Revenue'].sum().reset_index()
+            daily = stream.daily()
             fig_d = px.bar(daily, x='Date', y='Revenue', text_auto='.2s')
             fig_d.update_xaxes(dtick="D1", tickformat="%d.%m") # Каждый день
             fig_d.update_layout(margin=dict(l=0, r=0, t=30, b=0), height=400)
@@ -196,17 +177,15 @@ if selected_sheet:
 
         with tab3:
             st.markdown("### 👤 Персональная статистика")
-            managers = sorted(df['Manager'].unique())
+            managers = sorted(mgr_stats['Manager'])
             sel_mgr = st.selectbox("Выберите менеджера:", managers)
             
-            # Filter
-            m_df = df[df['Manager'] == sel_mgr]
-            
             # Metrics
-            m_rev = m_df['Revenue'].sum()
-            m_leads = m_df['Leads'].sum()
-            m_orders = m_df['Orders'].sum()
-            m_shifts = m_df['Date'].nunique()
+            m_row = mgr_stats[mgr_stats['Manager'] == sel_mgr].iloc[0]
+            m_rev = m_row['Revenue']
+            m_leads = m_row['Leads']
+            m_orders = m_row['Orders']
+            m_shifts = int(m_row['Date'])
             
             m_conv = (m_orders / m_leads * 100) if m_leads else 0
             m_avg_shift = (m_rev / m_shifts) if m_shifts else 0
@@ -221,7 +200,7 @@ if selected_sheet:
             
             # Personal Trend
             st.subheader(f"📊 Ежедневные продажи: {sel_mgr}")
-            m_daily = m_df.groupby('Date')['Revenue'].sum().reset_index()
+            m_daily = stream.daily(sel_mgr)
             fig_m = px.bar(m_daily, x='Date', y='Revenue', text_auto='.2s', title ="Личная динамика")
             fig_m.update_xaxes(dtick="D1", tickformat="%d.%m") # Каждый день
             fig_m.update_layout(margin=dict(t=30, b=0), height=350, showlegend=False)
@@ -229,10 +208,7 @@ if selected_sheet:
             
             # Comparison
             st.subheader("⚖️ Сравнение со средним")
-            # Avg Team Shift
-            avg_shift_team = (total_rev / df['Date'].nunique() / len(managers)) if len(managers) else 0 
-            # Better avg calculation: Total Revenue / Sum of all shifts across managers
-            # Actually easier: Mean of "AvgShift" from Leaderboard
+            # Avg Team Shift: mean of "AvgShift" from Leaderboard
             avg_shift_val = mgr_stats['AvgShift'].mean()
 
             comp_df = pd.DataFrame({
@@ -246,5 +222,56 @@ if selected_sheet:
             fig_c.update_layout(height=250, margin=dict(t=10, b=10), showlegend=False)
             st.plotly_chart(fig_c, use_container_width=True)
 
+        with tab4:
+            st.markdown("### 🔮 Прогноз выручки на конец месяца")
+            # Команда и все менеджеры одним пакетным расчетом
+            by_manager = stream.frame()
+            team = by_manager.groupby('Date', as_index=False)['Revenue'].sum().assign(Manager='🏢 Команда')
+            proj = forecast.project(pd.concat([team, by_manager], ignore_index=True), ['Manager'])
+            team_row = proj[proj['Manager'] == '🏢 Команда'].iloc[0]
+
+            f1, f2, f3 = st.columns(3)
+            f1.metric("📈 Прогноз", f"{team_row['Forecast']:,.0f} ₸".replace(",", " "),
+                      f"уже {team_row['Observed']:,.0f} ₸".replace(",", " "), delta_color="off")
+            f2.metric("↕️ Интервал 90%", f"{team_row['Low']/1e6:,.1f} – {team_row['High']/1e6:,.1f} млн ₸")
+            f3.metric("🗓 Осталось дней", f"{team_row['DaysLeft']}")
+
+            mgr_proj = proj[proj['Manager'] != '🏢 Команда'].sort_values('Forecast', ascending=False)
+            fig_f = go.Figure(go.Bar(
+                x=mgr_proj['Manager'], y=mgr_proj['Forecast'], marker_color='#8b5cf6',
+                error_y=dict(type='data', symmetric=False,
+                             array=mgr_proj['High'] - mgr_proj['Forecast'],
+                             arrayminus=mgr_proj['Forecast'] - mgr_proj['Low'])
+            ))
+            fig_f.update_layout(title="Прогноз по менеджерам (90%)", height=400, margin=dict(t=40, b=0))
+            st.plotly_chart(fig_f, use_container_width=True)
+
+        with tab5:
+            st.markdown("### 🚨 Необычные смены")
+            versions = tuple(branches.version(key, "sales") for key in CITIES.values())
+            flags = scan_anomalies(versions)
+            flags = flags[flags['City'] == selected_city_name].drop(columns='City')
+            st.caption(f"Выручка, лиды и конверсия смены против скользящей медианы самого менеджера "
+                       f"(|оценка| ≥ {anomalies.THRESHOLD}); все месяцы.")
+            if flags.empty:
+                st.success("Резких отклонений нет.")
+            else:
+                drops = flags[(flags['Метрика'] == 'Conversion') & (flags['Оценка'] < 0)]
+                if not drops.empty:
+                    st.warning("Провал конверсии: " + ", ".join(
+                        f"{m} {d:%d.%m}" for m, d in zip(drops['Manager'], drops['Date'])))
+                view = flags.rename(columns={'Manager': 'Менеджер', 'Date': 'Дата'})
+                st.dataframe(
+                    view.style.format({'Дата': '{:%d.%m.%Y}', 'Значение': '{:,.1f}', 'Норма': '{:,.1f}', 'Оценка': '{:+.1f}'}),
+                    use_container_width=True, hide_index=True
+                )
+
+        with tab6:
+            st.markdown("### 🔄 Что изменилось с прошлого обновления")
+            log = sheets.get(workbooks.CHANGES_SHEET)
+            if log is not None and not st.toggle("Все листы", value=False):
+                log = log[log['Лист'] == selected_sheet]
+            show_changes(log)
+
     except Exception as e:
         st.error(f"Ошибка чтения данных: {e}")
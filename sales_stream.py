@@ -0,0 +1,372 @@
+import pandas as pd
+import json
+import os
+import tempfile
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import changes
+
+# --- Streaming daily sales ---
+# Managers' intra-day rows arrive between workbook refreshes, either as files
+# dropped into INBOX_DIR (.csv / .json / .jsonl) or POSTed as JSON to the local
+# endpoint (which just writes them to INBOX_DIR). The inbox is the shared log:
+# every server process tails it and folds only the new rows into its rolling
+# aggregates, so an update costs O(new rows) instead of a workbook download.
+#
+# Row fields: City (branch key, city name or sheet id), Date, Manager, Leads, Orders, Revenue.
+#
+#   curl -X POST localhost:8601/sales -d '[{"City": "Алматы", "Date": "2026-02-14",
+#        "Manager": "Аня", "Leads": 12, "Orders": 4, "Revenue": 61000}]'
+#
+# The sheet stays the source of truth: streamed rows for manager-days that the
+# sheet already contains are dropped, whether they arrive before or after the
+# snapshot. When a new snapshot of the same month is published, only its
+# changed rows are applied (retract removed, fold in added); a new month
+# re-seeds the aggregates. Inbox files and streamed rows older than RETENTION
+# are forgotten.
+#
+# Files must appear in the inbox complete: write them under another name (or
+# with a .tmp suffix, which poll() ignores) and rename them in, as drop() does.
+# As a guard against plain copies, files modified less than SETTLE seconds ago
+# are left for the next poll.
+
+INBOX_DIR = os.environ.get("AURORA_SALES_INBOX", os.path.join(tempfile.gettempdir(), "aurora_sales_inbox"))
+PORT = int(os.environ.get("AURORA_SALES_PORT", "8601"))
+RETENTION = 3 * 24 * 3600  # inbox files older than this are deleted
+SETTLE = 2                 # inbox files modified more recently than this may still be being written
+
+METRICS = ['Revenue', 'Leads', 'Orders']
+
+_lock = threading.Lock()
+_aliases = {}      # city name / sheet id / key -> city key
+_seen = set()      # inbox files already ingested by this process (and still in the inbox)
+_reading = set()   # inbox files a poll() in another thread is reading right now
+_failed = {}       # inbox file -> mtime it failed to read at; retried once it changes
+_revision = 0      # inbox files ingested so far
+_stream = {}       # city key -> normalized rows not superseded by a sheet, with their arrival time
+_aggregates = {}   # (city key, sheet name) -> RollingSales
+_server = None
+
+
+class RollingSales:
+    """Running totals, per-manager stats and daily series for one month sheet."""
+
+    def __init__(self, period):
+        self.period = period  # pd.Period('2026-02', 'M')
+        self.seed = None       # snapshot frame the aggregates were seeded from
+        self.seed_days = None  # its (Manager, Date) index, to match streamed rows against
+        self.revenue = self.leads = self.orders = 0.0
+        self.managers = {}     # manager -> [revenue, leads, orders, shifts]
+        self.days = {}         # date -> revenue
+        self.manager_days = {} # (manager, date) -> revenue
+        self.rows = {}         # (manager, date) -> number of rows folded in
+        self.day_shifts = {}   # date -> number of manager-days
+
+    def ingest(self, rows, sign=1):
+        """Fold rows (Manager, Date, Leads, Orders, Revenue) in, or out with sign=-1; O(len(rows))."""
+        if rows.empty:
+            return
+        grouped = rows.groupby(['Manager', 'Date'], observed=True)[METRICS].agg(['sum', 'size'])
+        for (manager, date), revenue, _, leads, _, orders, count in grouped.itertuples(name=None):
+            revenue, leads, orders = sign * revenue, sign * leads, sign * orders
+            stats = self.managers.setdefault(manager, [0.0, 0.0, 0.0, 0])
+            stats[0] += revenue
+            stats[1] += leads
+            stats[2] += orders
+            if (manager, date) not in self.manager_days:
+                stats[3] += 1
+                self.manager_days[(manager, date)] = 0.0
+                self.day_shifts[date] = self.day_shifts.get(date, 0) + 1
+            self.manager_days[(manager, date)] += revenue
+            self.days[date] = self.days.get(date, 0.0) + revenue
+            self.revenue += revenue
+            self.leads += leads
+            self.orders += orders
+
+            # Last row of a manager-day retracted: the shift (and an empty day / manager) goes too
+            self.rows[(manager, date)] = self.rows.get((manager, date), 0) + sign * count
+            if self.rows[(manager, date)] <= 0:
+                del self.rows[(manager, date)], self.manager_days[(manager, date)]
+                stats[3] -= 1
+                self.day_shifts[date] -= 1
+                if not self.day_shifts[date]:
+                    del self.day_shifts[date], self.days[date]
+                if not stats[3]:
+                    del self.managers[manager]
+
+    # Readers run in session / API threads while poll() and aggregates() update
+    # the aggregates under _lock: every read copies under the same lock.
+
+    def totals(self):
+        with _lock:
+            revenue, leads, orders = self.revenue, self.leads, self.orders
+        return {
+            'Revenue': revenue, 'Leads': leads, 'Orders': orders,
+            'Conversion': (orders / leads * 100) if leads else 0,
+            'AvgCheck': (revenue / orders) if orders else 0,
+        }
+
+    def manager_stats(self):
+        """Same shape as the leaderboard: Manager, Revenue, Orders, Leads, Date (shifts), Conversion, AvgShift."""
+        with _lock:
+            rows = [(m, rev, orders, leads, shifts) for m, (rev, leads, orders, shifts) in self.managers.items()]
+        stats = pd.DataFrame(rows, columns=['Manager', 'Revenue', 'Orders', 'Leads', 'Date'])
+        stats['Conversion'] = (stats['Orders'] / stats['Leads'] * 100).fillna(0)
+        stats['AvgShift'] = (stats['Revenue'] / stats['Date']).fillna(0)
+        return stats.sort_values('AvgShift', ascending=False)
+
+    def frame(self):
+        """Long Manager / Date / Revenue frame of the manager-days (for batch forecasting)."""
+        with _lock:
+            rows = [(m, d, rev) for (m, d), rev in self.manager_days.items()]
+        return pd.DataFrame(rows, columns=['Manager', 'Date', 'Revenue'])
+
+    def daily(self, manager=None):
+        """Revenue per day, for the whole team or one manager."""
+        with _lock:
+            if manager is None:
+                items = list(self.days.items())
+            else:
+                items = [(d, rev) for (m, d), rev in self.manager_days.items() if m == manager]
+        return pd.DataFrame(sorted(items), columns=['Date', 'Revenue'])
+
+
+def register_city(key, *names):
+    """Let streamed rows name the city by any of `names` (display name, sheet id) as well as its key."""
+    with _lock:
+        _aliases[key] = key
+        for name in names:
+            _aliases[name] = key
+            _aliases[name.strip().lower()] = key
+            # "🌸 Алматы" -> also "алматы"
+            _aliases[name.split()[-1].strip().lower()] = key
+
+
+def city_id(city):
+    """City key for a key / name / alias / sheet id, or None if unknown."""
+    with _lock:
+        return _aliases.get(city, _aliases.get(str(city).strip().lower()))
+
+
+def revision():
+    """Number of inbox files this process has ingested; changes whenever the aggregates may have."""
+    with _lock:
+        return _revision
+
+
+def normalize(rows):
+    """Coerce raw rows like the sheet cleaner does; drops rows without manager/date."""
+    rows = pd.DataFrame(rows)
+    for col in ['City', 'Manager', 'Date'] + METRICS:
+        if col not in rows.columns:
+            rows[col] = None
+    rows = rows.dropna(subset=['Manager', 'Date'])
+    rows = rows.assign(
+        City=rows['City'].astype(str),
+        Manager=rows['Manager'].astype(str),
+        Date=pd.to_datetime(rows['Date'], errors='coerce').dt.normalize(),
+        **{k: pd.to_numeric(rows[k], errors='coerce').fillna(0) for k in METRICS}
+    )
+    return rows.dropna(subset=['Date'])[['City', 'Manager', 'Date'] + METRICS]
+
+
+def drop(rows):
+    """Persist rows to the inbox (atomic file write); every process picks them up on poll()."""
+    rows = normalize(rows)
+    if rows.empty:
+        return 0
+    os.makedirs(INBOX_DIR, exist_ok=True)
+    name = f"{time.time_ns():x}-{uuid.uuid4().hex[:8]}.jsonl"
+    fd, tmp = tempfile.mkstemp(dir=INBOX_DIR, suffix=".tmp")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        f.write(rows.to_json(orient="records", lines=True, date_format="iso", force_ascii=False))
+    os.replace(tmp, os.path.join(INBOX_DIR, name))
+    return len(rows)
+
+
+def _read_inbox_file(path):
+    if path.endswith(".csv"):
+        return pd.read_csv(path)
+    if path.endswith(".jsonl"):
+        return pd.read_json(path, lines=True, convert_dates=False)
+    with open(path, encoding="utf-8") as f:
+        return pd.DataFrame(json.load(f))
+
+
+def _expire(names, now):
+    """
+    Delete inbox files older than RETENTION and forget them and their rows
+    (caller holds _lock). Returns {name: mtime} of the files still in the inbox.
+    """
+    kept = {}
+    for name in names:
+        path = os.path.join(INBOX_DIR, name)
+        try:
+            mtime = os.path.getmtime(path)
+            if now - mtime > RETENTION:
+                os.remove(path)
+            else:
+                kept[name] = mtime
+        except OSError:
+            pass
+    _seen.intersection_update(kept)
+    for name in set(_failed) - set(kept):
+        del _failed[name]
+    for city, rows in _stream.items():
+        _stream[city] = rows[rows['Arrived'] >= now - RETENTION]
+    return kept
+
+
+def poll():
+    """Ingest inbox files this process hasn't seen yet. Returns the number of new rows."""
+    global _revision
+    try:
+        names = sorted(os.listdir(INBOX_DIR))
+    except OSError:
+        return 0
+
+    now = time.time()
+    with _lock:
+        mtimes = _expire(names, now)
+        fresh = [n for n, mtime in mtimes.items()
+                 if n.endswith((".csv", ".json", ".jsonl")) and n not in _seen and n not in _reading
+                 and now - mtime >= SETTLE and _failed.get(n) != mtime]
+        _reading.update(fresh)  # claimed while reading, so concurrent sessions never double-count
+
+    new_rows, read, failed = [], [], {}
+    for name in fresh:
+        try:
+            new_rows.append(normalize(_read_inbox_file(os.path.join(INBOX_DIR, name))).assign(Arrived=mtimes[name]))
+            read.append(name)
+        except (OSError, ValueError) as e:
+            print(f"Inbox error {name}: {e}")
+            failed[name] = mtimes[name]
+
+    with _lock:
+        # Only files read in full count as seen; a failed one is retried once it is rewritten
+        _reading.difference_update(fresh)
+        _seen.update(read)
+        _failed.update(failed)
+        if not new_rows:
+            return 0
+        _revision += len(read)
+        rows = pd.concat(new_rows, ignore_index=True)
+        rows['City'] = rows['City'].map(lambda c: _aliases.get(c, _aliases.get(c.strip().lower(), c)))
+        for city, part in rows.groupby('City'):
+            # Manager-days a loaded sheet already has are superseded by it
+            superseded = pd.Series(False, index=part.index)
+            for (sheet_city, _), agg in _aggregates.items():
+                if sheet_city == city:
+                    month = part['Date'].dt.to_period('M') == agg.period
+                    seeded = _manager_days(part).isin(agg.seed_days)
+                    agg.ingest(part[month & ~seeded])
+                    superseded |= month & seeded
+            _keep(city, part[~superseded])
+    return len(rows)
+
+
+def _manager_days(df):
+    return pd.MultiIndex.from_frame(df[['Manager', 'Date']].astype({'Manager': str}))
+
+
+def _keep(city, rows):
+    if not rows.empty:
+        _stream[city] = pd.concat([_stream[city], rows], ignore_index=True) if city in _stream else rows
+
+
+def _supersede(city, period, days):
+    """
+    Streamed rows of `period` whose manager-days a sheet has (`days`, its
+    _manager_days index): removed from the stream (the sheet covers them now)
+    and returned.
+    """
+    rows = _stream.get(city)
+    if rows is None or rows.empty:
+        return None
+    covered = (rows['Date'].dt.to_period('M') == period) & _manager_days(rows).isin(days)
+    _stream[city] = rows[~covered]
+    return rows[covered]
+
+
+def _update(agg, city, df):
+    """Move agg from its seed to snapshot `df` of the same month by applying only the changed rows."""
+    added, removed = changes.row_diff(agg.seed, df, ['Manager', 'Date'] + METRICS)
+    agg.ingest(removed, sign=-1)
+    agg.ingest(added)
+
+    # Streamed rows still in the stream were folded in; those the sheet now has come out
+    days = _manager_days(df)
+    covered = _supersede(city, agg.period, days)
+    if covered is not None:
+        agg.ingest(covered, sign=-1)
+    agg.seed, agg.seed_days = df, days
+
+
+def aggregates(city, sheet_name, df):
+    """
+    Rolling aggregates for one month sheet: seeded from the snapshot frame `df`
+    plus all streamed rows. A new snapshot of the same month is applied as a
+    row diff against the previous one; another month re-seeds.
+    """
+    key = (city, sheet_name)
+    with _lock:
+        agg = _aggregates.get(key)
+        if agg is not None and agg.seed is df:
+            return agg
+
+        period = df['Date'].max().to_period('M')
+        if agg is not None and agg.period == period:
+            _update(agg, city, df)
+            return agg
+
+        agg = RollingSales(period)
+        agg.seed, agg.seed_days = df, _manager_days(df)
+        agg.ingest(df)
+
+        # Streamed rows the sheet already has (same manager-day) are superseded by it
+        _supersede(city, period, agg.seed_days)
+        streamed = _stream.get(city)
+        if streamed is not None:
+            agg.ingest(streamed[streamed['Date'].dt.to_period('M') == period])
+
+        _aggregates[key] = agg
+    return agg
+
+
+class _InboxHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        if self.path.rstrip("/") != "/sales":
+            self.send_error(404)
+            return
+        try:
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"[]")
+            count = drop(body if isinstance(body, list) else [body])
+        except (ValueError, TypeError) as e:
+            self.send_error(400, str(e))
+            return
+        payload = json.dumps({"accepted": count}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve_http(port=PORT):
+    """Start the local POST /sales endpoint once per machine (other processes find the port taken)."""
+    global _server
+    with _lock:
+        if _server is not None:
+            return
+        try:
+            _server = ThreadingHTTPServer(("127.0.0.1", port), _InboxHandler)
+        except OSError:
+            _server = False  # another process already listens
+            return
+    threading.Thread(target=_server.serve_forever, name="sales-inbox", daemon=True).start()
@@ -0,0 +1,240 @@
+import numpy as np
+import pandas as pd
+import functools
+
+# --- Compact dtypes ---
+# Text columns with few distinct values (months, categories, managers, product
+# names) are stored as categoricals; numeric columns are narrowed only when
+# the round trip is exact.
+
+CATEGORY_MAX_RATIO = 0.5  # unique / rows below this -> categorical
+
+
+def _is_text(s):
+    return s.dtype == object or pd.api.types.is_string_dtype(s)
+
+
+def _downcast_numeric(s):
+    if pd.api.types.is_bool_dtype(s):
+        return s
+
+    if pd.api.types.is_integer_dtype(s):
+        # Never narrower than 32 bits: scalar maths on int8/int16 overflows silently
+        if s.empty or (s.min() >= -2**31 and s.max() < 2**31):
+            return s.astype("int32")
+        return s
+
+    if pd.api.types.is_float_dtype(s):
+        values = s.dropna()
+        if len(values) == len(s) and (values % 1 == 0).all():
+            return _downcast_numeric(s.astype("int64"))
+        narrow = s.astype("float32")
+        if ((narrow.astype("float64") == s) | s.isna()).all():
+            return narrow
+    return s
+
+
+def compact_frame(df, categorical=None, max_ratio=CATEGORY_MAX_RATIO):
+    """
+    Return df with compact dtypes.
+    categorical: columns always turned into categoricals (if present).
+    Other text columns become categorical when unique/rows < max_ratio.
+    """
+    if df.empty:
+        return df
+
+    forced = set(categorical or [])
+    out = {}
+    for col in df.columns:
+        s = df[col]
+        if isinstance(s.dtype, pd.CategoricalDtype):
+            out[col] = s
+        elif _is_text(s):
+            if col in forced or s.nunique(dropna=True) < len(s) * max_ratio:
+                out[col] = s.astype("category")
+            else:
+                out[col] = s
+        elif pd.api.types.is_numeric_dtype(s):
+            out[col] = _downcast_numeric(s)
+        else:
+            out[col] = s
+    return pd.DataFrame(out, index=df.index)
+
+
+# --- Memory report ---
+
+def frame_bytes(df):
+    return int(df.memory_usage(deep=True).sum()) if df is not None else 0
+
+
+def memory_report(before, after):
+    """
+    before/after: dict name -> DataFrame (raw vs compacted).
+    Returns a DataFrame with per-frame MB before and after compaction.
+    """
+    rows = []
+    for name in before:
+        b = frame_bytes(before[name])
+        a = frame_bytes(after.get(name))
+        rows.append({"Лист": name, "До, МБ": b / 2**20, "После, МБ": a / 2**20})
+
+    report = pd.DataFrame(rows)
+    if report.empty:
+        return report
+
+    total = {"Лист": "ИТОГО", "До, МБ": report["До, МБ"].sum(), "После, МБ": report["После, МБ"].sum()}
+    report = pd.concat([report, pd.DataFrame([total])], ignore_index=True)
+    report["Экономия, %"] = (1 - report["После, МБ"] / report["До, МБ"]).fillna(0) * 100
+    return report
+
+
+def process_footprint(report):
+    """
+    (raw MB, compact MB) of the frames held per server process: all sessions
+    of a process share one copy from the data plane, whatever their number.
+    """
+    total = report[report["Лист"] == "ИТОГО"].iloc[0]
+    return total["До, МБ"], total["После, МБ"]
+
+
+# --- Sheet schemas ---
+# Each sheet the apps read is declared once: target column -> header synonyms,
+# type and drop rules. Headers are matched case-insensitively by substring;
+# a field takes the first header containing its earliest synonym, and fields
+# claim headers in declaration order. The resolution is cached per header
+# row, so twelve month sheets with the same headers resolve once.
+#
+# validate() then coerces every field with one vectorized call per column and
+# returns the rows it dropped with the reason, instead of silently losing them.
+# Dtype compaction stays with the caller (compact_frame).
+#
+# Field options:
+#   synonyms  header substrings, highest priority first
+#   type      "text" | "number" | "date"
+#   required  header must exist (else SchemaError) and the value must parse
+#   default   value for a missing optional header / unparsable optional number
+#   min       numbers <= min are dropped (e.g. fixed-cost percentages)
+#   dayfirst  for dates typed as text (dd.mm.yyyy)
+
+REPORT_COLUMNS = ["Лист", "Строка", "Причина"]
+
+_SCHEMAS = {}
+
+
+class SchemaError(ValueError):
+    """Required headers are missing from a sheet."""
+
+
+def _normalize_header(header):
+    return " ".join(str(header).lower().split())
+
+
+def register_schema(name, fields, keep_extra=False):
+    """Declare sheet schema `name`; fields is {column: options} in claim order."""
+    compiled = []
+    for column, options in fields.items():
+        if options.get("type", "text") not in ("text", "number", "date"):
+            raise ValueError(f"{name}.{column}: unknown type {options['type']!r}")
+        synonyms = tuple(_normalize_header(s) for s in options.get("synonyms", (column,)))
+        compiled.append({"column": column, "synonyms": synonyms, "type": options.get("type", "text"),
+                         "required": options.get("required", False), "default": options.get("default"),
+                         "min": options.get("min"), "dayfirst": options.get("dayfirst", False)})
+    _SCHEMAS[name] = {"name": name, "fields": compiled, "keep_extra": keep_extra}
+    return _SCHEMAS[name]
+
+
+@functools.lru_cache(maxsize=256)
+def _resolve(name, headers):
+    """{column: header position} for normalized `headers` of a sheet of schema `name`."""
+    claimed = {}
+    taken = set()
+    for field in _SCHEMAS[name]["fields"]:
+        for synonym in field["synonyms"]:
+            free = [i for i in range(len(headers)) if i not in taken]
+            # Exact header first ("Сумма" over "Сумма в долларах"), then substring
+            position = next((i for i in free if headers[i] == synonym), None)
+            if position is None:
+                position = next((i for i in free if synonym in headers[i]), None)
+            if position is not None:
+                claimed[field["column"]] = position
+                taken.add(position)
+                break
+    return claimed
+
+
+_UNPARSED = {"number": "не число", "date": "не дата", "text": "пусто"}
+
+
+def _to_number(s):
+    if _is_text(s):
+        # "1 234 567,5" -> 1234567.5 (spaces, non-breaking spaces, decimal comma)
+        s = s.astype(str).str.replace(r"[\s\xa0]", "", regex=True).str.replace(",", ".", regex=False)
+    return pd.to_numeric(s, errors="coerce")
+
+
+def _to_text(s):
+    text = s.astype(str).str.strip()
+    return text.where(s.notna() & (text != ""))
+
+
+def validate(df, name, sheet=None):
+    """
+    Map headers, coerce and filter one sheet of schema `name`.
+    Returns (frame, report); report lists dropped rows (Лист, Строка, Причина),
+    Строка being the row number in the spreadsheet (header = row 1).
+    Raises SchemaError if a required header is missing.
+    """
+    schema = _SCHEMAS[name]
+    positions = _resolve(name, tuple(_normalize_header(h) for h in df.columns))
+    missing = [f["column"] for f in schema["fields"] if f["required"] and f["column"] not in positions]
+    if missing:
+        raise SchemaError(f"{sheet or name}: нет колонок {missing} (заголовки: {[str(h) for h in df.columns]})")
+
+    out = {}
+    reasons = {}
+    for field in schema["fields"]:
+        column = field["column"]
+        if column not in positions:
+            out[column] = pd.Series(field["default"], index=df.index)
+            continue
+
+        raw = df.iloc[:, positions[column]]
+        if field["type"] == "number":
+            values = _to_number(raw)
+        elif field["type"] == "date":
+            values = pd.to_datetime(raw, errors="coerce", dayfirst=field["dayfirst"])
+        else:
+            values = _to_text(raw)
+
+        reason = pd.Series(None, index=df.index, dtype=object)
+        if field["required"]:
+            empty = raw.isna() | (raw.astype(str).str.strip() == "")
+            reason = reason.mask(values.isna(), f"{column}: {_UNPARSED[field['type']]} ('" + raw.astype(str) + "')")
+            reason = reason.mask(empty, f"{column}: пусто")
+        elif field["default"] is not None:
+            values = values.fillna(field["default"])
+        if field["min"] is not None:
+            reason = reason.mask(reason.isna() & (values <= field["min"]), f"{column}: ≤ {field['min']:g}")
+        reasons[column] = reason
+        out[column] = values
+
+    if schema["keep_extra"]:
+        used = set(positions.values())
+        for i, header in enumerate(df.columns):
+            if i not in used and header not in out:
+                out[header] = df.iloc[:, i]
+
+    # First failing field per row, in declaration order
+    reason = pd.DataFrame(reasons, index=df.index).bfill(axis=1).iloc[:, 0] if reasons else pd.Series(None, index=df.index, dtype=object)
+    dropped = reason.notna().to_numpy()
+    report = pd.DataFrame({
+        "Лист": sheet or name,
+        "Строка": np.flatnonzero(dropped) + 2,
+        "Причина": reason[dropped].to_numpy(),
+    }, columns=REPORT_COLUMNS)
+
+    return pd.DataFrame(out, index=df.index)[~dropped].reset_index(drop=True), report
+
+
+def empty_report():
+    return pd.DataFrame(columns=REPORT_COLUMNS)
@@ -1,17 +1,14 @@
 import streamlit as st
 import pandas as pd
-import plotly.graph_objects as go
-import ssl
-import requests
-from io import BytesIO
-
-# --- 🛠 ЛЕЧЕНИЕ SSL И ЗАВИСАНИЙ ---
-try:
-    _create_unverified_https_context = ssl._create_unverified_context
-except AttributeError:
-    pass
-else:
-    ssl._create_default_https_context = _create_unverified_https_context
+
+import anomalies
+import branches
+import breakeven
+import calibration
+import data_plane
+import forecast
+import workbooks
+from freshness import show_changes, show_data_age
 
 # --- Конфигурация ---
 st.set_page_config(page_title="Финансовый Симулятор", layout="wide")
@@ -35,97 +32,155 @@ st.markdown("""
     </style>
     """, unsafe_allow_html=True)
 
-# --- Ссылка на таблицу ---
-SHEET_ID = "1NUpmMswEtKyX1AIeM9p1m8VHjWpPnR8VeJfr1m7Qgsg"
-GID = "1677404640" 
-EXPORT_URL = f"https://docs.google.com/spreadsheets/d/{SHEET_ID}/export?format=xlsx&gid={GID}"
+# --- Таблицы филиалов (branches.json) ---
+FIXED_BRANCHES = branches.with_workbook("fixed_costs")
+SALES_BRANCHES = branches.with_workbook("sales")
+
+if not FIXED_BRANCHES:
+    st.error("Ни у одного филиала в branches.json нет таблицы постоянных расходов.")
+    st.stop()
 
-@st.cache_data(ttl=600) # Кэшируем на 10 минут, чтобы не грузить постоянно
-def load_fixed_costs():
+def load_fixed_costs(branch):
+    """Последняя сохранённая версия постоянных расходов (одна копия на все сессии, фоновое обновление раз в 10 минут)."""
     try:
-        # 1. Явное скачивание файла (это надежнее, чем pd.read_excel(url))
-        headers = {'User-Agent': 'Mozilla/5.0'} # Притворяемся браузером
-        response = requests.get(EXPORT_URL, headers=headers, verify=False, timeout=10)
-        response.raise_for_status() # Если ошибка 404/500 - скажет сразу
-        
-        # 2. Превращаем скачанное в файл для Pandas
-        file_content = BytesIO(response.content)
-        df = pd.read_excel(file_content)
-        
-        # 3. Логика фильтрации (берем суммы > 100)
-        clean_data = []
-        total_sum = 0
-        
-        # Проверяем, есть ли нужные колонки по индексам (0 и 4)
-        if df.shape[1] < 5:
-            st.error("В таблице мало колонок! Проверьте формат.")
-            return 0, pd.DataFrame()
-
-        for index, row in df.iterrows():
-            try:
-                # Берем данные по индексам колонок (0 - Название, 4 - Сумма E)
-                name = str(row.iloc[0]) 
-                value = row.iloc[4]     
-                
-                # Превращаем в число
-                numeric_value = float(value)
-                
-                # Фильтр: только суммы > 100 (исключаем пустые и проценты)
-                if numeric_value > 100:
-                    clean_data.append({"Расход": name, "Сумма": numeric_value})
-                    total_sum += numeric_value
-            except:
-                continue # Если строка пустая или ошибка - пропускаем
-                
-        return total_sum, pd.DataFrame(clean_data)
-        
+        frames = branches.serve(branch, "fixed_costs")
+        details = frames["fixed_costs"]
+        return (details["Сумма"].sum(), details, frames.get(workbooks.DROPPED_SHEET, pd.DataFrame()),
+                frames.get(workbooks.CHANGES_SHEET))
     except Exception as e:
         st.error(f"Ошибка загрузки: {e}")
-        return 0, pd.DataFrame()
+        return 0, pd.DataFrame(), pd.DataFrame(), None
 
-# Загрузка
-with st.spinner('Скачиваем данные из таблицы...'):
-    base_fixed_costs, details_df = load_fixed_costs()
+def load_city_sheets():
+    """Листы продаж всех городов: {город: {лист: DataFrame}} (тот же снимок, что у отчета продаж)."""
+    city_sheets = {}
+    for city_name, key in SALES_BRANCHES.items():
+        try:
+            city_sheets[city_name] = branches.serve(key, "sales")
+        except Exception as e:
+            st.warning(f"{city_name}: нет данных продаж ({e})")
+    return city_sheets
+
+@st.cache_data(show_spinner=False, max_entries=16)
+def _calibrate(versions, cogs_categories, _sources, _pnl, _city_sheets):
+    # Ключ кэша - версии снимков в data plane; сами фреймы не хэшируются.
+    # Новая версия пересчитывает только месяцы из журнала изменений.
+    sales = [df[['Date', 'Revenue', 'Orders']] for sheets in _city_sheets.values()
+             for df in workbooks.month_sheets(sheets).values() if not df.empty]
+    return calibration.recalibrate(
+        versions[0], _sources,
+        _pnl.get('Лист1', pd.DataFrame()), _pnl.get('Таргет', pd.DataFrame()),
+        _pnl.get('Продажи по месяцам', pd.DataFrame()),
+        pd.concat(sales, ignore_index=True) if sales else pd.DataFrame(),
+        cogs_categories
+    )
+
+def load_pnl(branch):
+    if "pnl" not in branches.BRANCHES[branch]:
+        return {}
+    try:
+        return branches.serve(branch, "pnl")
+    except Exception as e:
+        st.warning(f"P&L: нет данных для калибровки ({e})")
+        return {}
+
+def sales_versions(city_sheets):
+    """Версии снимков продаж городов - ключ кэша для расчетов по ним."""
+    return tuple(branches.version(SALES_BRANCHES[name], "sales") for name in sorted(city_sheets))
+
+def snapshot_source(name, frames):
+    """(время создания снимка, журнал изменений) - по ним калибровка находит измененные месяцы."""
+    manifest = data_plane.current(name)
+    return (manifest["created"] if manifest else 0), frames.get(workbooks.CHANGES_SHEET)
+
+def load_calibration(branch, pnl, city_sheets):
+    """Фактические ср. чек, накрутка и таргет филиала по месяцам; пересчет только при новой версии данных."""
+    own = {name: sheets for name, sheets in city_sheets.items() if SALES_BRANCHES[name] == branch}
+    pnl_version = branches.version(branch, "pnl") if pnl else None
+    sources = {branches.url(SALES_BRANCHES[name], "sales"): snapshot_source(branches.url(SALES_BRANCHES[name], "sales"), sheets)
+               for name, sheets in own.items()}
+    if pnl:
+        sources[branches.url(branch, "pnl")] = snapshot_source(branches.url(branch, "pnl"), pnl)
+    # Категории себестоимости филиала - "cogs_categories" в branches.json
+    cogs_categories = tuple(branches.BRANCHES[branch].get("cogs_categories", calibration.COGS_KEYWORDS))
+    return _calibrate((branch, pnl_version) + sales_versions(own), cogs_categories, sources, pnl, own)
+
+@st.cache_data(show_spinner=False, max_entries=16)
+def manager_anomalies(versions, _city_sheets):
+    # Все города и месяцы одним проходом; пересчет только при новой версии данных
+    return anomalies.manager_anomalies(workbooks.stack_sales(_city_sheets))
+
+def calibrated(value, default, low, high, step):
+    """Значение из факта, приведенное к шагу и границам виджета; default если факта нет."""
+    if pd.isna(value):
+        return default
+    return min(max(round(value / step) * step, low), high)
 
 # --- Интерфейс ---
 
 with st.sidebar:
     st.header("🎛 Панель Управления")
+    branch_name = st.selectbox("Филиал", list(FIXED_BRANCHES)) if len(FIXED_BRANCHES) > 1 else next(iter(FIXED_BRANCHES))
+    branch = FIXED_BRANCHES[branch_name]
+
+# Загрузка
+with st.spinner('Скачиваем данные из таблицы...'):
+    base_fixed_costs, details_df, skipped_df, fixed_changes = load_fixed_costs(branch)
+    city_sheets = load_city_sheets()
+    pnl = load_pnl(branch)
+    calib = load_calibration(branch, pnl, city_sheets)
+
+with st.sidebar:
+    show_data_age(branches.url(branch, "fixed_costs"), st)
     
     st.divider()
+
+    # Калибровка: значения по умолчанию берем из фактического месяца
+    calib_months = calib.dropna(subset=['Ср. чек', 'Накрутка', 'Таргет в день'], how='all')['Месяц'].tolist()
+    calib_month = st.selectbox("📐 Калибровка по факту", ["Вручную"] + calib_months[::-1],
+                               index=1 if calib_months else 0,
+                               help="Ср. чек, накрутка и таргет в день из P&L и отчетов продаж за выбранный месяц")
+    fact = calib.set_index('Месяц').loc[calib_month] if calib_month != "Вручную" else pd.Series(dtype=float)
+    if not fact.empty:
+        st.caption(
+            f"Факт: чек {fact['Ср. чек']:,.0f} ₸ · накрутка {fact['Накрутка']:.2f} · "
+            f"таргет {fact['Таргет в день']:,.0f} ₸/день".replace(",", " ").replace("nan", "—")
+        )
+        if pd.notna(fact['Категории себестоимости']):
+            st.caption(f"Себестоимость: {fact['Категории себестоимости']}")
+        else:
+            st.caption("Себестоимость: ни одна категория расходов не подошла (cogs_categories в branches.json)")
+
+    st.divider()
     
     st.subheader("1. 💸 Переменные Расходы")
-    target_daily = st.number_input("📢 Таргет в день (₸)", value=5000, step=1000)
+    target_daily = st.number_input("📢 Таргет в день (₸)", value=int(calibrated(fact.get('Таргет в день'), breakeven.DEFAULTS["target_daily"], 0, 10**9, 100)), step=1000)
     st.caption(f"В месяц: {target_daily * 30:,.0f} ₸")
     
     simulation_add = st.number_input("➕ Добавить к расходам (Симуляция)", value=0, step=50000)
-    var_cost_per_order = st.number_input("📦 Расход на 1 заказ (упаковка)", value=1000, step=100)
+    var_cost_per_order = st.number_input("📦 Расход на 1 заказ (упаковка)", value=breakeven.DEFAULTS["var_cost_per_order"], step=100)
 
     st.divider()
     st.subheader("2. 💐 Экономика Заказа")
-    avg_check = st.slider("💰 Средний чек", 5000, 50000, 15000, step=500)
-    markup = st.slider("📈 Накрутка (Markup)", 1.5, 3.5, 2.2, step=0.1)
+    avg_check = st.slider("💰 Средний чек", 5000, 50000, int(calibrated(fact.get('Ср. чек'), breakeven.DEFAULTS["avg_check"], 5000, 50000, 500)), step=500)
+    markup = st.slider("📈 Накрутка (Markup)", 1.5, 3.5, round(calibrated(fact.get('Накрутка'), breakeven.DEFAULTS["markup"], 1.5, 3.5, 0.1), 1), step=0.1)
     
     st.divider()
     st.subheader("3. 🏦 Комиссии (%)")
-    pct_kaspi = st.number_input("Kaspi Pay", value=0.95, step=0.05)
-    pct_tax = st.number_input("Налог", value=3.0, step=0.5)
-    pct_florist = st.number_input("Флорист", value=2.0, step=0.5)
-    pct_manager = st.number_input("Менеджер", value=2.0, step=0.5)
+    pct_kaspi = st.number_input("Kaspi Pay", value=breakeven.DEFAULTS["pct_kaspi"], step=0.05)
+    pct_tax = st.number_input("Налог", value=breakeven.DEFAULTS["pct_tax"], step=0.5)
+    pct_florist = st.number_input("Флорист", value=breakeven.DEFAULTS["pct_florist"], step=0.5)
+    pct_manager = st.number_input("Менеджер", value=breakeven.DEFAULTS["pct_manager"], step=0.5)
 
 # --- Расчеты ---
-total_fixed_costs = base_fixed_costs + (target_daily * 30) + simulation_add
-cogs = avg_check / markup
+total_fixed_costs = breakeven.total_fixed_costs(base_fixed_costs, target_daily, simulation_add)
 total_commission_pct = pct_kaspi + pct_tax + pct_florist + pct_manager
-commission_money = avg_check * (total_commission_pct / 100)
-margin_per_order = avg_check - cogs - var_cost_per_order - commission_money
-
-if margin_per_order > 0:
-    break_even_qty = total_fixed_costs / margin_per_order
-    break_even_revenue = break_even_qty * avg_check
-else:
-    break_even_qty = 999999
-    break_even_revenue = 0
+be = breakeven.break_even(total_fixed_costs, avg_check, markup, var_cost_per_order, total_commission_pct)
+cogs = be["cogs"]
+commission_money = be["commission_money"]
+margin_per_order = be["margin_per_order"]
+break_even_qty = be["qty"]
+break_even_revenue = be["revenue"]
 
 # --- Визуализация ---
 st.title("🛡 Финансовый Симулятор: Точка Безубыточности")
@@ -149,7 +204,7 @@ with st.container(border=True):
     )
 
     # 3. Quantity
-    daily_qty = break_even_qty / 30 if break_even_qty != 999999 else 0
+    daily_qty = break_even_qty / 30 if break_even_qty != breakeven.NO_BREAK_EVEN else 0
     col3.metric(
         "📦 В букетах", 
         f"{break_even_qty:,.0f} шт".replace(",", " "), 
@@ -158,10 +213,92 @@ with st.container(border=True):
 
 with st.expander("🔍 Детализация постоянных расходов (из Таблицы)"):
     st.dataframe(details_df, use_container_width=True)
+    if not skipped_df.empty:
+        st.caption(f"Не учтено строк: {len(skipped_df)} (пустые, проценты и суммы ≤ 100)")
+        st.dataframe(skipped_df, hide_index=True, use_container_width=True)
     st.write(f"**+ 📢 Таргет (мес):** {target_daily*30:,.0f}")
     st.write(f"**+ 🎰 Симуляция:** {simulation_add:,.0f}")
     st.info(f"💰 **ИТОГО FIX: {total_fixed_costs:,.0f} ₸**")
 
+# --- Аномалии: ошибки ввода в расходах и резкие провалы менеджеров ---
+expense_flags = pnl.get('Аномалии', pd.DataFrame())
+manager_flags = manager_anomalies(sales_versions(city_sheets), city_sheets)
+with st.expander(f"🚨 Аномалии: расходы {len(expense_flags)} · менеджеры {len(manager_flags)}", expanded=False):
+    st.caption(f"Строки, далеко выходящие за скользящую медиану своего ряда (|оценка| ≥ {anomalies.THRESHOLD}).")
+    st.markdown("**💸 Расходы и таргет**")
+    if expense_flags.empty:
+        st.success("Подозрительных сумм нет.")
+    else:
+        st.dataframe(
+            expense_flags[['Дата', 'Месяц', 'Категория', 'Значение', 'Норма', 'Оценка']]
+                .style.format({'Дата': '{:%d.%m.%Y}', 'Значение': '{:,.0f}', 'Норма': '{:,.0f}', 'Оценка': '{:+.1f}'}),
+            use_container_width=True, hide_index=True
+        )
+    st.markdown("**👥 Смены менеджеров (все города)**")
+    if manager_flags.empty:
+        st.success("Резких отклонений нет.")
+    else:
+        st.dataframe(
+            manager_flags.style.format({'Date': '{:%d.%m.%Y}', 'Значение': '{:,.1f}', 'Норма': '{:,.1f}', 'Оценка': '{:+.1f}'}),
+            use_container_width=True, hide_index=True
+        )
+
+# --- Что изменилось: журнал изменений снимков (P&L, расходы, продажи филиала) ---
+with st.expander("🔄 Что изменилось с прошлого обновления", expanded=False):
+    logs = {"🏢 Постоянные расходы": fixed_changes, "📊 P&L": pnl.get(workbooks.CHANGES_SHEET)}
+    logs.update({f"🛒 Продажи: {name}": sheets.get(workbooks.CHANGES_SHEET)
+                 for name, sheets in city_sheets.items() if SALES_BRANCHES[name] == branch})
+    for title, log in logs.items():
+        st.markdown(f"**{title}**")
+        show_changes(log)
+
+# --- Прогноз месяца по фактическим продажам ---
+def load_month_sales(city_sheets):
+    """Текущий месяц всех городов одним длинным фреймом (City, Manager, Date, Revenue)."""
+    parts = []
+    for city_name, sheets in city_sheets.items():
+        _, month_df = workbooks.latest_sales_sheet(sheets)
+        if not month_df.empty:
+            parts.append(month_df[['Manager', 'Date', 'Revenue']].astype({'Manager': str}).assign(City=city_name))
+    return pd.concat(parts, ignore_index=True) if parts else pd.DataFrame()
+
+with st.expander("📅 Прогноз месяца и вероятность выйти в безубыток", expanded=False):
+    # Точка Б/У посчитана по постоянным расходам выбранного филиала: сравниваем только с его продажами
+    month_sales = load_month_sales({name: sheets for name, sheets in city_sheets.items() if SALES_BRANCHES[name] == branch})
+    if month_sales.empty:
+        st.info(f"Нет данных продаж филиала {branch_name} для прогноза.")
+    else:
+        # Города и менеджеры одним пакетным расчетом: строки города = 'Итого'
+        city_totals = month_sales.groupby(['City', 'Date'], as_index=False)['Revenue'].sum().assign(Manager='Итого')
+        proj = forecast.project(pd.concat([city_totals, month_sales], ignore_index=True), ['City', 'Manager'], scope=['City'])
+        cities = proj[proj['Manager'] == 'Итого']
+
+        # Все города филиала вместе: суммы прогнозов, разбросы независимы
+        total_forecast = cities['Forecast'].sum()
+        total_std = (cities['Std'] ** 2).sum() ** 0.5
+        p_total = float(forecast.probability_above(break_even_revenue, total_forecast, total_std)) if margin_per_order > 0 else 0.0
+
+        p1, p2 = st.columns(2)
+        p1.metric(f"📈 Прогноз выручки ({branch_name})", f"{total_forecast:,.0f} ₸".replace(",", " "),
+                  f"{total_forecast - break_even_revenue:+,.0f} ₸ к точке Б/У".replace(",", " "))
+        p2.metric("🎯 Вероятность безубыточности", f"{p_total * 100:.0f}%")
+
+        is_city = proj['Manager'] == 'Итого'
+        view = proj.assign(
+            P=forecast.probability_above(break_even_revenue, proj['Forecast'], proj['Std']) * 100,
+            _order=~is_city
+        )
+        view['P'] = view['P'].where(is_city)  # шанс покрыть Б/У имеет смысл только для города
+        view = view.sort_values(['City', '_order', 'Forecast'], ascending=[True, True, False])
+        view = view[['City', 'Manager', 'Observed', 'Forecast', 'Low', 'High', 'DaysLeft', 'P']]
+        view.columns = ['Город', 'Менеджер', 'Факт', 'Прогноз', 'Мин (90%)', 'Макс (90%)', 'Дней осталось', 'P(≥ Б/У), %']
+        st.dataframe(
+            view.style.format({'Факт': '{:,.0f}', 'Прогноз': '{:,.0f}', 'Мин (90%)': '{:,.0f}',
+                               'Макс (90%)': '{:,.0f}', 'P(≥ Б/У), %': '{:.0f}'}, na_rep=''),
+            use_container_width=True, hide_index=True
+        )
+        st.caption(f"P для города — шанс покрыть точку безубыточности филиала {branch_name} (его постоянные расходы).")
+
 # График
 if margin_per_order > 0:
     st.divider()
@@ -175,6 +312,7 @@ if margin_per_order > 0:
     y_costs = [total_fixed_costs, total_fixed_costs + (var_total_per_unit * x_max)]
     y_revenue = [0, avg_check * x_max]
     
+    import plotly.graph_objects as go  # загружаем только когда рисуем график
     fig = go.Figure()
     fig.add_trace(go.Scatter(x=x_values, y=y_costs, mode='lines', name='Расходы', line=dict(color='#d32f2f', width=3)))
     fig.add_trace(go.Scatter(x=x_values, y=y_revenue, mode='lines', name='Выручка', line=dict(color='#2e7d32', width=3)))
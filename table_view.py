@@ -0,0 +1,80 @@
+import streamlit as st
+import pandas as pd
+import math
+
+# --- Paginated detail tables ---
+# Filtering and sorting run on the raw numeric/datetime columns; formatting is
+# applied only to the rows of the visible page, so a rerun serializes at most
+# page_size rows whatever the size of the month.
+
+PAGE_SIZES = [25, 50, 100, 250]
+
+
+def filter_frame(df, amount_col=None, min_amount=None, max_amount=None, category_col=None, categories=None):
+    mask = pd.Series(True, index=df.index)
+    if amount_col and min_amount is not None:
+        mask &= df[amount_col] >= min_amount
+    if amount_col and max_amount is not None:
+        mask &= df[amount_col] <= max_amount
+    if category_col and categories:
+        mask &= df[category_col].isin(categories)
+    return df[mask]
+
+
+def page_slice(df, sort_col, ascending, page, page_size):
+    """
+    Rows of one page (1-based) after sorting by sort_col. Ties keep the frame's
+    order on every page (nlargest/nsmallest keep='first' and a stable sort
+    agree), so paging never repeats or skips a row.
+    """
+    start = (page - 1) * page_size
+    if start + page_size < len(df) / 4:
+        # Small window of a big frame: partial selection instead of a full sort
+        top = df.nsmallest if ascending else df.nlargest
+        try:
+            rows = top(start + page_size, sort_col, keep='first')
+            if len(rows) == start + page_size:  # fewer: NaNs reached the page, the full sort places them last
+                return rows.iloc[start:]
+        except TypeError:
+            pass  # column type nlargest can't order
+    return df.sort_values(by=sort_col, ascending=ascending, kind='stable').iloc[start:start + page_size]
+
+
+def paged_table(df, key, columns, formatters=None, sort_col=None, ascending=False,
+                amount_col=None, category_col=None, height=500):
+    """
+    Render df[columns] as a paginated table with server-side sort/filter.
+    formatters: {column: function(value) -> str}, applied to the visible page only.
+    """
+    formatters = formatters or {}
+
+    with st.expander("⚙️ Сортировка и фильтры"):
+        f1, f2 = st.columns(2)
+        sort_col = f1.selectbox("Сортировать по", columns, index=columns.index(sort_col) if sort_col in columns else 0, key=f"{key}_sort")
+        ascending = f2.toggle("По возрастанию", value=ascending, key=f"{key}_asc")
+
+        min_amount = max_amount = None
+        if amount_col:
+            a1, a2 = st.columns(2)
+            min_amount = a1.number_input("Сумма от", value=None, step=1000.0, key=f"{key}_min")
+            max_amount = a2.number_input("Сумма до", value=None, step=1000.0, key=f"{key}_max")
+
+        categories = None
+        if category_col:
+            options = sorted(df[category_col].dropna().unique().tolist())
+            categories = st.multiselect("Категории", options, key=f"{key}_cat")
+
+    filtered = filter_frame(df, amount_col, min_amount, max_amount, category_col, categories)
+
+    p1, p2, p3 = st.columns([1, 1, 2])
+    page_size = p1.selectbox("Строк", PAGE_SIZES, key=f"{key}_size")
+    pages = max(1, math.ceil(len(filtered) / page_size))
+    if st.session_state.get(f"{key}_page", 1) > pages:
+        st.session_state[f"{key}_page"] = pages  # filter shrank the result
+    page = p2.number_input("Страница", min_value=1, max_value=pages, step=1, key=f"{key}_page")
+    p3.caption(f"Строк: {len(filtered)} из {len(df)} · стр. {page}/{pages}")
+
+    view = page_slice(filtered[columns], sort_col, ascending, page, page_size)
+    if formatters:
+        view = view.assign(**{col: view[col].map(fmt) for col, fmt in formatters.items() if col in view.columns})
+    st.dataframe(view, use_container_width=True, height=height, hide_index=True)
@@ -0,0 +1,8 @@
+import os
+import sys
+import tempfile
+
+# Modules live at the repository root; keep the data plane and inbox out of the real temp dirs
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("AURORA_DATA_DIR", tempfile.mkdtemp(prefix="aurora_test_data_"))
+os.environ.setdefault("AURORA_SALES_INBOX", tempfile.mkdtemp(prefix="aurora_test_inbox_"))
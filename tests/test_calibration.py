@@ -0,0 +1,24 @@
+import pandas as pd
+
+import calibration
+
+
+def _expenses():
+    return pd.DataFrame({"Категория": ["Цветы", "Закуп ленты", "Аренда", "Аренда"],
+                         "Сумма": [100.0, 50.0, 300.0, 300.0],
+                         "Месяц": ["Январь", "Январь", "Январь", "Февраль"]})
+
+
+def test_cogs_counts_only_the_configured_categories():
+    pnl_sales = pd.DataFrame({"Месяц": ["Январь", "Февраль"], "Сумма продаж": [1000.0, 1000.0]})
+    table = calibration.calibrate(_expenses(), pd.DataFrame(), pnl_sales, pd.DataFrame(),
+                                  cogs_categories=["цвет"]).set_index("Месяц")
+    assert table.loc["Январь", "Себестоимость"] == 100.0
+    assert table.loc["Январь", "Категории себестоимости"] == "Цветы"
+    assert pd.isna(table.loc["Февраль", "Категории себестоимости"])
+
+
+def test_default_categories_list_every_match():
+    table = calibration.calibrate(_expenses(), pd.DataFrame(), pd.DataFrame(), pd.DataFrame()).set_index("Месяц")
+    assert table.loc["Январь", "Себестоимость"] == 150.0
+    assert table.loc["Январь", "Категории себестоимости"] == "Закуп ленты, Цветы"
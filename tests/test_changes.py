@@ -0,0 +1,27 @@
+import pandas as pd
+import pytest
+
+import changes
+
+KEYS = [["Manager", "Date"]]
+
+
+def _sheet():
+    return pd.DataFrame({"Manager": ["A", "B"], "Date": pd.to_datetime(["2026-02-01", "2026-02-01"]),
+                         "Revenue": [100.0, 200.0]})
+
+
+@pytest.mark.parametrize("old, new, kind", [
+    (pd.DataFrame(), _sheet(), "добавлено"),   # sheet fixed after being published with bad headers
+    (_sheet(), pd.DataFrame(), "удалено"),     # sheet broken by a header edit
+])
+def test_column_less_sheet_is_logged_whole(old, new, kind):
+    found = changes.diff_workbook({"Февраль 2026": old}, {"Февраль 2026": new}, KEYS)
+    assert list(found["Изменение"]) == [kind, kind]
+    assert set(found["Месяц"]) == {"Февраль"}
+
+
+def test_edit_is_logged_per_field():
+    new = _sheet().assign(Revenue=[100.0, 250.0])
+    found = changes.diff_workbook({"Февраль 2026": _sheet()}, {"Февраль 2026": new}, KEYS)
+    assert found[["Изменение", "Поле", "Было", "Стало"]].values.tolist() == [["изменено", "Revenue", "200", "250"]]
@@ -0,0 +1,40 @@
+import threading
+import time
+
+import pandas as pd
+
+import refresher
+
+
+def _wait(condition, seconds):
+    until = time.time() + seconds
+    while not condition() and time.time() < until:
+        time.sleep(0.05)
+    return condition()
+
+
+def test_a_stalled_download_does_not_hold_up_other_workbooks(monkeypatch):
+    monkeypatch.setattr(refresher, "TICK", 0.2)
+    monkeypatch.setattr(refresher, "DEADLINE", 3)
+    monkeypatch.setattr(refresher, "_jobs", {})
+    monkeypatch.setattr(refresher, "_thread", None)
+    release, runs = threading.Event(), []
+
+    def stalled():
+        release.wait(30)
+        return {"a": pd.DataFrame({"x": [0]})}
+
+    def fast():
+        runs.append(time.time())
+        return {"a": pd.DataFrame({"x": [len(runs)]})}
+
+    try:
+        refresher.register("test-stalled", stalled, 1)
+        refresher.register("test-fast", fast, 1)
+        # Well inside the stalled worker's DEADLINE, the 1 s workbook keeps its cadence
+        assert _wait(lambda: len(runs) >= 2, refresher.DEADLINE - 0.5)
+        # and past it the stalled one is reported
+        assert _wait(lambda: refresher.status("test-stalled")["last_error"], refresher.DEADLINE + 1)
+        assert refresher.status("test-stalled")["refreshing"]
+    finally:
+        release.set()
@@ -0,0 +1,98 @@
+import os
+import sys
+import threading
+
+import pandas as pd
+
+import sales_stream
+
+
+def _rows(manager, day, revenue=100.0):
+    return pd.DataFrame({"Manager": [manager], "Date": [pd.Timestamp(2026, 2, day)],
+                         "Revenue": [revenue], "Leads": [1.0], "Orders": [1.0]})
+
+
+def test_reads_are_safe_while_another_thread_updates():
+    agg = sales_stream.RollingSales(pd.Period("2026-02", "M"))
+    agg.ingest(pd.concat([_rows(f"Seed{i}", i % 28 + 1) for i in range(2000)], ignore_index=True))
+    stop, errors = threading.Event(), []
+
+    def writer():
+        i = 0
+        while not stop.is_set():
+            rows = _rows(f"M{i % 50}", i % 28 + 1)
+            with sales_stream._lock:
+                agg.ingest(rows)
+            with sales_stream._lock:
+                agg.ingest(rows, sign=-1)
+            i += 1
+
+    thread = threading.Thread(target=writer)
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)  # switch threads mid-iteration
+    thread.start()
+    try:
+        for _ in range(50):
+            agg.manager_stats()
+            agg.daily()
+            agg.frame()
+            agg.totals()
+    except RuntimeError as e:
+        errors.append(e)
+    finally:
+        stop.set()
+        thread.join()
+        sys.setswitchinterval(interval)
+    assert not errors
+
+
+def test_poll_reads_settled_files_and_retries_failed_ones(tmp_path, monkeypatch):
+    monkeypatch.setattr(sales_stream, "INBOX_DIR", str(tmp_path))
+    monkeypatch.setattr(sales_stream, "_seen", set())
+    monkeypatch.setattr(sales_stream, "_failed", {})
+    monkeypatch.setattr(sales_stream, "_stream", {})
+    path = tmp_path / "rows.json"
+    row = '{"City": "x", "Date": "2026-02-01", "Manager": "A", "Revenue": 10}'
+
+    path.write_text("[" + row)  # still being written
+    assert sales_stream.poll() == 0  # too young to read
+    settled = path.stat().st_mtime - sales_stream.SETTLE - 1
+    os.utime(path, (settled, settled))
+    assert sales_stream.poll() == 0
+    assert "rows.json" not in sales_stream._seen
+
+    path.write_text("[" + row + "]")
+    os.utime(path, (settled + 1, settled + 1))
+    assert sales_stream.poll() == 1
+    assert "rows.json" in sales_stream._seen
+    assert sales_stream.poll() == 0
+
+
+def _stream_in(rows):
+    """drop() rows and poll them in, past the settle delay."""
+    sales_stream.drop(rows)
+    for name in os.listdir(sales_stream.INBOX_DIR):
+        old = os.path.getmtime(os.path.join(sales_stream.INBOX_DIR, name)) - sales_stream.SETTLE - 1
+        os.utime(os.path.join(sales_stream.INBOX_DIR, name), (old, old))
+    return sales_stream.poll()
+
+
+def test_rows_the_sheet_covers_are_dropped_or_retracted(tmp_path, monkeypatch):
+    monkeypatch.setattr(sales_stream, "INBOX_DIR", str(tmp_path))
+    for name, value in [("_seen", set()), ("_failed", {}), ("_stream", {}), ("_aggregates", {})]:
+        monkeypatch.setattr(sales_stream, name, value)
+    sheet = pd.concat([_rows("A", 1), _rows("B", 1)], ignore_index=True)
+    agg = sales_stream.aggregates("x", "Февраль 2026", sheet)
+
+    # A manager-day the sheet already has is dropped; a new one is folded in and kept
+    _stream_in([{"City": "x", "Date": "2026-02-01", "Manager": "A", "Revenue": 999},
+                {"City": "x", "Date": "2026-02-02", "Manager": "C", "Revenue": 50}])
+    assert agg.totals()["Revenue"] == 250
+    assert sales_stream._stream["x"]["Manager"].tolist() == ["C"]
+
+    # The next snapshot has C's day: the streamed row is retracted for the sheet's own
+    sheet = pd.concat([sheet, _rows("C", 2, revenue=70.0)], ignore_index=True)
+    assert sales_stream.aggregates("x", "Февраль 2026", sheet) is agg
+    assert agg.totals()["Revenue"] == 270
+    assert agg.rows[("C", pd.Timestamp(2026, 2, 2))] == 1
+    assert sales_stream._stream["x"].empty
@@ -0,0 +1,17 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from table_view import page_slice
+
+
+@pytest.mark.parametrize("ascending", [False, True])
+def test_pages_of_tied_rows_match_the_full_stable_sort(ascending):
+    # Few distinct amounts: early pages take the nlargest/nsmallest path, later ones the full sort
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({"Сумма": rng.integers(0, 5, 1000).astype(float), "Строка": range(1000)})
+    df.loc[rng.choice(1000, 20, replace=False), "Сумма"] = np.nan
+    pages = [page_slice(df, "Сумма", ascending, page, 25) for page in range(1, 41)]
+
+    full = df.sort_values("Сумма", ascending=ascending, kind="stable")
+    assert pd.concat(pages)["Строка"].tolist() == full["Строка"].tolist()
@@ -0,0 +1,216 @@
+import pandas as pd
+import subprocess
+import io
+import os
+
+import anomalies
+from schema import SchemaError, compact_frame, empty_report, memory_report, register_schema, validate
+
+# --- Workbook sources ---
+# Download + parse for every Google Sheet the apps read. Nothing here touches
+# Streamlit: parsers return {sheet name: DataFrame} or raise, and the apps
+# decide how to show errors. Which sheets belong to which branch is
+# configured in branches.json (see branches.py).
+
+HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
+}
+
+# Low-cardinality text columns stored as categoricals
+CATEGORICAL_COLUMNS = ['Категория', 'Месяц', 'Manager', 'Название']
+
+# Rows dropped by schema validation, published next to the sheets of every workbook
+DROPPED_SHEET = 'Отбраковка'
+# Row-level changes against the previous snapshot (changes.py)
+CHANGES_SHEET = 'Изменения'
+# Frames derived at ingest, not sheets of the workbook
+SERVICE_SHEETS = {'Память', 'Аномалии', DROPPED_SHEET, CHANGES_SHEET}
+
+
+# Point at a local stand-in (e.g. http://127.0.0.1:8000/d) to test stalls and outages
+SHEETS_BASE = os.environ.get("AURORA_SHEETS_BASE", "https://docs.google.com/spreadsheets/d")
+
+
+def export_url(sheet_id, gid=None):
+    url = f"{SHEETS_BASE}/{sheet_id}/export?format=xlsx"
+    return f"{url}&gid={gid}" if gid else url
+
+
+def fetch(url, timeout=30):
+    """Download a workbook; falls back to system curl if requests fails."""
+    import requests  # only the refresher thread downloads; keep it off the startup path
+
+    # verify=False / curl -k: certificate checks are off for these exports only,
+    # instead of patching ssl's default context for the whole process
+    try:
+        response = requests.get(url, headers=HEADERS, verify=False, timeout=timeout)
+        response.raise_for_status()
+        return response.content
+    except Exception as e:
+        print(f"Requests error: {e}")
+
+    result = subprocess.run(["curl", "-L", "-k", "-s", "--max-time", str(timeout), url], capture_output=True)
+    if result.returncode == 0 and len(result.stdout) > 0:
+        return result.stdout
+    raise IOError(f"Не удалось скачать файл: {url}")
+
+
+def read_workbook(content):
+    try: return pd.ExcelFile(io.BytesIO(content), engine='openpyxl')
+    except: return pd.ExcelFile(io.BytesIO(content))
+
+
+# --- P&L workbook (Лист1 / Таргет / Продажи по месяцам) ---
+
+PNL_SHEETS = ['Лист1', 'Таргет', 'Продажи по месяцам']
+
+register_schema('Лист1', {
+    'Дата': {'type': 'date', 'required': True, 'dayfirst': True},
+    'Категория': {'default': 'Uncategorized'},
+    'Сумма': {'type': 'number', 'default': 0.0},
+}, keep_extra=True)
+
+register_schema('Таргет', {
+    'Дата': {'type': 'date', 'required': True, 'dayfirst': True},
+    'Сумма': {'synonyms': ['сумма в тенге'], 'type': 'number', 'default': 0.0},
+}, keep_extra=True)
+
+register_schema('Продажи по месяцам', {
+    'Месяц': {'required': True},
+    'Сумма продаж': {'type': 'number', 'default': 0.0},
+}, keep_extra=True)
+
+MONTH_NAMES = {
+    1: 'Январь', 2: 'Февраль', 3: 'Март', 4: 'Апрель',
+    5: 'Май', 6: 'Июнь', 7: 'Июль', 8: 'Август',
+    9: 'Сентябрь', 10: 'Октябрь', 11: 'Ноябрь', 12: 'Декабрь'
+}
+
+def get_russian_month_name(date_obj):
+    if pd.isnull(date_obj):
+        return None
+    return MONTH_NAMES.get(date_obj.month)
+
+def preprocess_pnl(sheets):
+    """{sheet: raw frame} -> ({sheet: validated frame}, dropped rows report)."""
+    frames, reports = {}, []
+    for name in PNL_SHEETS:
+        df, report = validate(sheets[name], name, sheet=name)
+        if 'Дата' in df.columns:
+            df['Месяц'] = df['Дата'].dt.month.map(MONTH_NAMES)
+        frames[name] = df
+        reports.append(report)
+
+    # Target rows are one expense category of their own
+    frames['Таргет']['Категория'] = 'Таргет'
+    return frames, pd.concat(reports, ignore_index=True)
+
+def parse_pnl(content):
+    """
+    Sheets plus 'Память': memory report of the compaction (raw vs compact dtypes),
+    'Отбраковка': rows dropped by validation, and 'Аномалии': outlier expense /
+    ad-spend rows, scanned once per download.
+    """
+    xls = read_workbook(content)
+    raw, dropped = preprocess_pnl({name: pd.read_excel(xls, name) for name in PNL_SHEETS})
+    compact = {name: compact_frame(df, categorical=CATEGORICAL_COLUMNS) for name, df in raw.items()}
+    return {**compact, 'Память': memory_report(raw, compact), DROPPED_SHEET: dropped,
+            'Аномалии': anomalies.expense_anomalies(raw['Лист1'], raw['Таргет'])}
+
+def pnl_builder(url):
+    """build() for the refresher: download + parse the P&L workbook."""
+    return lambda: parse_pnl(fetch(url))
+
+
+# --- Product catalog (combo calculator) ---
+
+register_schema('catalog', {
+    'Название': {'required': True},
+    'Категория': {},
+    'Себестоимость': {'type': 'number', 'default': 0},
+    'Цена_Базовая': {'synonyms': ['цена_базовая', 'базовая цена', 'цена'], 'type': 'number', 'default': 0},
+})
+
+def parse_catalog(content):
+    df, dropped = validate(pd.read_excel(io.BytesIO(content)), 'catalog', sheet='Каталог')
+    return {"catalog": compact_frame(df, categorical=["Категория", "Название"]), DROPPED_SHEET: dropped}
+
+def catalog_builder(url):
+    return lambda: parse_catalog(fetch(url, timeout=10))
+
+
+# --- Fixed costs (break-even simulator) ---
+
+# Only amounts > 100: drops empty rows and the commission percentages below the costs
+register_schema('fixed_costs', {
+    'Расход': {'synonyms': ['наименование', 'расход', 'статья', 'название'], 'default': ''},
+    'Сумма': {'synonyms': ['итого', 'сумма'], 'type': 'number', 'required': True, 'min': 100},
+})
+
+def parse_fixed_costs(content):
+    details, dropped = validate(pd.read_excel(io.BytesIO(content)), 'fixed_costs', sheet='Постоянные расходы')
+    return {"fixed_costs": details, DROPPED_SHEET: dropped}
+
+def fixed_costs_builder(url):
+    return lambda: parse_fixed_costs(fetch(url, timeout=10))
+
+
+# --- Manager sales (one sheet per month) ---
+
+register_schema('sales', {
+    'Manager': {'synonyms': ['имя менеджера'], 'required': True},
+    'Leads': {'synonyms': ['лидов'], 'type': 'number', 'default': 0},
+    'Orders': {'synonyms': ['оформлены'], 'type': 'number', 'default': 0},
+    'Revenue': {'synonyms': ['итого'], 'type': 'number', 'default': 0},
+    'Date': {'synonyms': ['дата'], 'type': 'date', 'required': True},
+})
+
+SALES_COLUMNS = ['Manager', 'Leads', 'Orders', 'Revenue', 'Date']
+
+def sales_sheet_names(sheet_names):
+    # Фильтр листов: Только 2026 и без Оффлайна
+    sheets = [s for s in sheet_names if "2026" in s and "оффлайн" not in s.lower()]
+
+    # Если вдруг нет 2026, показываем все, кроме системных
+    if not sheets:
+        sheets = [s for s in sheet_names if "sheet" not in s.lower()]
+    return sheets
+
+def clean_sales_sheet(df, sheet=None):
+    """Map headers and clean one month sheet -> (frame, dropped rows); empty frame if headers are wrong."""
+    try:
+        df, dropped = validate(df, 'sales', sheet=sheet)
+    except SchemaError as e:
+        return pd.DataFrame(), pd.DataFrame({'Лист': [sheet], 'Строка': [None], 'Причина': [str(e)]})
+    return compact_frame(df, categorical=['Manager']), dropped
+
+def parse_sales(content):
+    """Month sheets plus DROPPED_SHEET (rows dropped from all of them)."""
+    xls = read_workbook(content)
+    sheets, reports = {}, []
+    for name in sales_sheet_names(xls.sheet_names):
+        sheets[name], dropped = clean_sales_sheet(pd.read_excel(xls, sheet_name=name), sheet=name)
+        reports.append(dropped)
+    sheets[DROPPED_SHEET] = pd.concat(reports, ignore_index=True) if reports else empty_report()
+    return sheets
+
+def sales_builder(url):
+    """build() for the refresher: download + parse one city's sales workbook."""
+    return lambda: parse_sales(fetch(url, timeout=30))
+
+def month_sheets(sheets):
+    """Month sheets of a parsed sales workbook (without the SERVICE_SHEETS reports)."""
+    return {name: df for name, df in sheets.items() if name not in SERVICE_SHEETS}
+
+def stack_sales(city_sheets):
+    """All month sheets of all cities ({city: {sheet: df}}) as one long frame with a City column."""
+    parts = [df.assign(City=city) for city, sheets in city_sheets.items() for df in month_sheets(sheets).values() if not df.empty]
+    return pd.concat(parts, ignore_index=True) if parts else pd.DataFrame(columns=['City'] + SALES_COLUMNS)
+
+def latest_sales_sheet(sheets):
+    """(name, frame) of the month sheet with the most recent date, or (None, empty)."""
+    valid = {name: df for name, df in month_sheets(sheets).items() if not df.empty}
+    if not valid:
+        return None, pd.DataFrame()
+    name = max(valid, key=lambda n: valid[n]['Date'].max())
+    return name, valid[name]